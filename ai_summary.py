@@ -1,13 +1,126 @@
+import os
+import re
+import json
 import time
+import hashlib
 import streamlit as st
-from together import Together
-from credentials import Credentials
+from cache import PersistentCache, DEFAULT_CACHE_DIR
+from credentials import Credentials, get_config_value
+from resources import registry
+from singleflight import SingleFlight
+import llm_client  # registers the LLM client
+
+MODEL = "mistralai/Mistral-7B-Instruct-v0.3"
+# Bump when the prompt wording changes so cached summaries from the old prompt are not served
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIR, "summaries.sqlite")
+SUMMARY_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+SUMMARY_CACHE_MAX_ENTRIES = 5000
+# Streamed tokens are handed to the UI in chunks, whichever limit is reached first
+STREAM_FLUSH_SECONDS = 0.05
+STREAM_FLUSH_CHARACTERS = 48
+# Reviews are summarized in fixed blocks, a new review only changes the last block
+REVIEW_CHUNK_SIZE = 20
+# "map_reduce" summarizes every review in chunks, "representative" one diverse subset
+DEFAULT_REVIEW_SUMMARY_STRATEGY = "map_reduce"
+
+
+def landmark_summary_prompt(landmark, city, country):
+    return f"Craft a professional and concise 80-word summary about {landmark} in {city}, {country}. Include the origin of its name, historical significance, and cultural impact. Share fascinating facts that make it a must-visit for tourists."
+
+
+def review_summary_prompt(landmark, city, country, reviews):
+    return f"Craft a professional and concise 2-3 sentence review summary about {landmark} in {city}, {country} considering the reviews: {', '.join([r['Review'] for r in reviews])}. Focus on verifiable information and avoid claims without evidence (e.g., rumors, speculation). At the end mention unverifiable/unrelated claims if any."
+
+
+def review_reduce_prompt(landmark, city, country, chunk_summaries):
+    return f"Combine the following partial summaries of reviews about {landmark} in {city}, {country} into one professional and concise 2-3 sentence review summary: {' '.join(chunk_summaries)}. Focus on verifiable information and avoid claims without evidence (e.g., rumors, speculation). At the end mention unverifiable/unrelated claims if any."
+
+
+def coalesce_tokens(tokens, flush_seconds=STREAM_FLUSH_SECONDS, flush_characters=STREAM_FLUSH_CHARACTERS):
+    buffer = []
+    size = 0
+    last_flush = time.monotonic()
+    for token in tokens:
+        buffer.append(token)
+        size += len(token)
+        now = time.monotonic()
+        if size >= flush_characters or now - last_flush >= flush_seconds:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+
+def replay_text(text, chunk_characters=STREAM_FLUSH_CHARACTERS):
+    # Cached summaries are streamed back word by word in UI sized chunks, without any delay
+    return coalesce_tokens(re.findall(r"\s*\S+\s*", text), float("inf"), chunk_characters)
+
+
+def timed_stream(chunks, timings):
+    start = time.perf_counter()
+    for chunk in chunks:
+        if "ttft_ms" not in timings:
+            timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        yield chunk
+    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def summary_cache_key(kind,
+                      landmark,
+                      city,
+                      country,
+                      content=None,
+                      model=MODEL,
+                      prompt_version=SUMMARY_PROMPT_VERSION):
+    normalized = [" ".join(str(value).casefold().split()) for value in (landmark, city, country)]
+    key = [kind, *normalized, model, prompt_version]
+    if content is not None:
+        key.append(hashlib.sha1(json.dumps(content).encode("utf-8")).hexdigest())
+    return json.dumps(key)
+
+
+def _review_order(review):
+    # Oldest first, so new reviews end up in the last chunk and earlier chunks keep their keys.
+    # Reviews without a timestamp (written before CreatedAt existed) all come before the others.
+    created_at = review.get("CreatedAt")
+    if created_at is None:
+        return False, 0, review.get("Username", ""), review.get("Review", "")
+    timestamp = created_at.timestamp() if hasattr(created_at, "timestamp") else created_at
+    return True, timestamp, review.get("Username", ""), review.get("Review", "")
+
+
+def review_chunks(reviews, chunk_size=REVIEW_CHUNK_SIZE):
+    ordered = sorted(reviews, key=_review_order)
+    return [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+
+
+# Concurrent sessions asking for the same prompt share one Together request
+summary_flights = SingleFlight()
+
+
+@st.cache_resource(show_spinner=False)
+def get_summary_cache():
+    # "sqlite" keeps one cache per host, SQLite in WAL mode must not be put on a network filesystem.
+    # "firestore" shares it between replicas and deploys.
+    ttl = float(get_config_value("summary_cache_ttl", SUMMARY_CACHE_TTL_SECONDS))
+    if get_config_value("summary_cache_backend", "sqlite").lower() == "firestore":
+        from firestore_cache import FirestoreCache
+        return FirestoreCache(get_config_value("summary_cache_collection", "summary_cache"), ttl=ttl)
+    return PersistentCache(
+        path=get_config_value("summary_cache_path", SUMMARY_CACHE_PATH),
+        table="summaries",
+        ttl=ttl,
+        max_entries=int(get_config_value("summary_cache_max_entries", SUMMARY_CACHE_MAX_ENTRIES)),
+    )
 
 
 class MockOpenAI_LLM:
 
     def __init__(self):
-        pass
+        self.stream_timings = {}
 
     def generate_summary(self, prompt):
         summary = """
@@ -19,9 +132,18 @@ class MockOpenAI_LLM:
         summary = """
         The Maiden Tower is a 12th-century monument in the Old City, Baku, Azerbaijan. Along with the Shirvanshahs' Palace, dated to the 15th century, it forms a group of historic monuments listed in 2001 under the UNESCO World Heritage List of historical monuments as cultural property, Category III. It is one of the most prominent national and cultural symbols of Azerbaijan.
         """
-        for s in summary:
-            yield s
-            time.sleep(0.06)
+        return coalesce_tokens(re.findall(r"\s*\S+\s*", summary))
+
+    def stream_landmark_summary(self, landmark, city, country):
+        self.stream_timings = {"cached": False}
+        return timed_stream(self.stream_summary(landmark_summary_prompt(landmark, city, country)),
+                            self.stream_timings)
+
+    def landmark_summary(self, landmark, city, country):
+        return self.generate_summary(landmark_summary_prompt(landmark, city, country))
+
+    def review_summary(self, landmark, city, country, reviews):
+        return self.summarize_review(review_summary_prompt(landmark, city, country, reviews))
 
     def summarize_review(self, review):
         summary = """
@@ -34,19 +156,126 @@ class AI_Summary(Credentials):
 
     def __init__(self):
         super().__init__()
+        self.summary_cache = get_summary_cache()
+        self.stream_timings = {}
+
+    def landmark_summary(self, landmark, city, country):
+        # Raises when the LLM request fails, so it can run off the script thread
+        key = summary_cache_key("landmark", landmark, city, country)
+        summary = self.summary_cache.get(key)
+        if summary is None:
+            summary = self._generate(landmark_summary_prompt(landmark, city, country))
+            if summary:
+                self.summary_cache.set(key, summary)
+        return summary
+
+    def stream_landmark_summary(self, landmark, city, country):
+        # Streams from the summary cache when possible, otherwise from the LLM and the
+        # completed text is cached for the next request (streamed or not)
+        key = summary_cache_key("landmark", landmark, city, country)
+        cached = self.summary_cache.get(key)
+        self.stream_timings = {"cached": cached is not None}
+        if cached is not None:
+            yield from timed_stream(replay_text(cached), self.stream_timings)
+            return
+        parts = []
+        for chunk in timed_stream(self.stream_summary(landmark_summary_prompt(landmark, city, country)),
+                                  self.stream_timings):
+            parts.append(chunk)
+            yield chunk
+        if parts:
+            self.summary_cache.set(key, "".join(parts))
+
+    def _cached_review_summary(self, key, prompt):
+        summary = self.summary_cache.get(key)
+        if summary is None:
+            summary = self.summarize_review(prompt)
+            if summary:
+                self.summary_cache.set(key, summary)
+        return summary
+
+    def _cached_chunk_summary(self, key, prompt):
+        # Runs on the enrichment pool, raises instead of reporting errors with st.error
+        summary = self.summary_cache.get(key)
+        if summary is None:
+            summary = self._summarize(prompt)
+            if summary:
+                self.summary_cache.set(key, summary)
+        return summary
+
+    def review_summary(self, landmark, city, country, reviews):
+        strategy = get_config_value("review_summary_strategy", DEFAULT_REVIEW_SUMMARY_STRATEGY)
+        if strategy == "representative":
+            return self.representative_review_summary(landmark, city, country, reviews)
+        return self.map_reduce_review_summary(landmark, city, country, reviews)
+
+    def representative_review_summary(self, landmark, city, country, reviews):
+        # One prompt built from a diverse subset that fits the token budget; the summary is
+        # cached against the ids of the chosen reviews, not against all of them
+        from review_selection import DEFAULT_TOKEN_BUDGET, select_representative, selection_ids
+        budget = int(get_config_value("review_token_budget", DEFAULT_TOKEN_BUDGET))
+        selected = select_representative(reviews, budget)
+        key = summary_cache_key("review_selection", landmark, city, country, selection_ids(selected))
+        return self._cached_review_summary(key, review_summary_prompt(landmark, city, country, selected))
+
+    def map_reduce_review_summary(self, landmark, city, country, reviews):
+        # Map-reduce: every chunk of reviews is summarized (and cached) on its own, then the
+        # chunk summaries are combined. Prompt size stays bounded by the chunk size. The chunks
+        # are independent and requested concurrently, only the reduce waits for all of them.
+        from enrichment import get_enrichment_executor
+        chunks = review_chunks(reviews)
+        if len(chunks) == 1:
+            content = [[r["Review"], r.get("Score10")] for r in chunks[0]]
+            key = summary_cache_key("review_chunk", landmark, city, country, content)
+            return self._cached_review_summary(key, review_summary_prompt(landmark, city, country, chunks[0]))
+        executor = get_enrichment_executor()
+        futures = []
+        for chunk in chunks:
+            content = [[r["Review"], r.get("Score10")] for r in chunk]
+            key = summary_cache_key("review_chunk", landmark, city, country, content)
+            futures.append(
+                executor.submit(self._cached_chunk_summary, key, review_summary_prompt(landmark, city, country,
+                                                                                       chunk)))
+        try:
+            chunk_summaries = [future.result() for future in futures]
+        except Exception as e:
+            st.error(f"""
+                ### Error: LLM Based Summary could not be generated.
+                - Error Code: 5x002
+                - There may be issues with OpenAI API.
+                - Most likely, it's not your fault.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            st.stop()
+        key = summary_cache_key("review_reduce", landmark, city, country, chunk_summaries)
+        return self._cached_review_summary(key, review_reduce_prompt(landmark, city, country, chunk_summaries))
+
+    def summary_cache_metrics(self):
+        return {
+            "hits": self.summary_cache.hits,
+            "misses": self.summary_cache.misses,
+            "hit_ratio": round(self.summary_cache.hit_ratio, 3),
+            "entries": len(self.summary_cache),
+            "coalesced_requests": summary_flights.shared,
+            "llm": registry.get("llm_client").metrics(),
+        }
+
+    def _complete(self, messages):
+        return registry.get("llm_client").chat(MODEL, messages)
+
+    def _stream_tokens(self, messages):
+        return registry.get("llm_client").stream_chat(MODEL, messages)
+
+    def _generate(self, prompt):
+        return summary_flights.do(("generate_summary", prompt), lambda: self._complete([{
+            "role": "user",
+            "content": prompt
+        }]))
 
     @st.cache_data(show_spinner=False)
     def generate_summary(_self, prompt):
         try:
-            client = Together(api_key=_self.TogetherAI_credentials)
-            summary = client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.3",
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }],
-            )
-            response = summary.choices[0].message.content
+            response = _self._generate(prompt)
             print("Cache miss: generate_summary")
             return response
         except Exception as e:
@@ -61,7 +290,6 @@ class AI_Summary(Credentials):
 
     def stream_summary(_self, prompt):
         try:
-            client = Together(api_key=_self.TogetherAI_credentials)
             messages = [
                 {
                     "role": "system",
@@ -72,14 +300,9 @@ class AI_Summary(Credentials):
                     "content": prompt
                 },
             ]
-            summary = client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.3",
-                messages=messages,
-                stream=True,
-            )
-            for s in summary:
-                yield s.choices[0].text
-                time.sleep(0.07)
+            # Sessions streaming the same prompt listen to one upstream stream
+            tokens = summary_flights.stream(("stream_summary", prompt), lambda: _self._stream_tokens(messages))
+            yield from coalesce_tokens(tokens)
         except Exception as e:
             st.error(f"""
                 ### Error: LLM Based Summary could not be generated.
@@ -90,29 +313,28 @@ class AI_Summary(Credentials):
                 """)
             st.stop()
 
+    def _summarize(self, review):
+        # Raises when the LLM request fails, so it can run off the script thread
+        messages = [
+            {
+                "role":
+                    "system",
+                "content":
+                    """Your job is to summarize the reviews for a given landmark.
+                You must focus on the reviews and extract as much info as possible and analyze the reviews
+                to write a conclusion with upsides and downsides of the landmark with some key points.""",
+            },
+            {
+                "role": "user",
+                "content": review
+            },
+        ]
+        return summary_flights.do(("summarize_review", review), lambda: self._complete(messages))
+
     @st.cache_data(show_spinner=False)
     def summarize_review(_self, review):
         try:
-            client = Together(api_key=_self.TogetherAI_credentials)
-            summary = client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.3",
-                messages=[
-                    {
-                        "role":
-                            "system",
-                        "content":
-                            """Your job is to summarize the reviews for a given landmark.
-                        You must focus on the reviews and extract as much info as possible and analyze the reviews
-                        to write a conclusion with upsides and downsides of the landmark with some key points.""",
-                    },
-                    {
-                        "role": "user",
-                        "content": review
-                    },
-                ],
-            )
-            response = summary.choices[0].message.content
-            return response
+            return _self._summarize(review)
         except Exception as e:
             st.error(f"""
                 ### Error: LLM Based Summary could not be generated.
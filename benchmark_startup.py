@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ENTRY_MODULE = "app"
+# Modules that must stay out of the cold start, they are imported by the feature that needs them
+DEFERRED_MODULES = [
+    "google.cloud.vision",
+    "google.cloud.firestore",
+    "folium",
+    "branca",
+    "geopy",
+    "fuzzywuzzy",
+    "streamlit_folium",
+    "PIL",
+    "numpy",
+]
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+
+
+def measure_import_times(module=ENTRY_MODULE):
+    # Same data as `python -X importtime -c "import app"`, one line per imported module
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+    return timings
+
+
+def compare_with_baseline(report, baseline, threshold):
+    regressions = []
+    for name, timing in report["modules"].items():
+        previous = baseline["modules"].get(name)
+        if previous is None:
+            if timing["self_us"] > 1000:
+                regressions.append(f"{name}: new import, {timing['self_us'] / 1000:.1f} ms")
+            continue
+        if previous["self_us"] and timing["self_us"] > previous["self_us"] * (1 + threshold) + 1000:
+            regressions.append(f"{name}: {previous['self_us'] / 1000:.1f} ms -> {timing['self_us'] / 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-module import time of the app entry point.")
+    parser.add_argument("--module", default=ENTRY_MODULE, help="Module to import (default: app).")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest modules to print.")
+    parser.add_argument("--output", help="Write the full report as JSON to this file.")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help="Allowed relative slowdown per module before it counts as a regression.",
+    )
+    args = parser.parse_args()
+
+    timings = measure_import_times(args.module)
+    total_us = sum(timing["self_us"] for timing in timings.values())
+    report = {"module": args.module, "total_us": total_us, "modules": timings}
+    print(f"Cold import of '{args.module}': {total_us / 1000:.1f} ms over {len(timings)} modules")
+    for name, timing in sorted(timings.items(), key=lambda item: item[1]["self_us"], reverse=True)[:args.top]:
+        print(f"  {timing['self_us'] / 1000:8.1f} ms  {name}")
+
+    failures = [f"{name}: imported at startup" for name in DEFERRED_MODULES if name in timings]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare_with_baseline(report, json.load(f), args.threshold)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if failures:
+        print("Startup regressions:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
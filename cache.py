@@ -0,0 +1,105 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+DEFAULT_CACHE_DIR = ".cache"
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+
+
+# SQLite backed key/value store, shared by every session and process on the host.
+# Entries expire after `ttl` seconds, least recently used ones go past `max_entries`.
+# An entry can carry a short text tag, e.g. a hash to rebuild an in-memory index from.
+class PersistentCache:
+
+    def __init__(self, path, table="cache", ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    tag TEXT
+                )
+                """)
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+            if "tag" not in columns:
+                # Caches created before tags existed
+                conn.execute(f"ALTER TABLE {self.table} ADD COLUMN tag TEXT")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return default
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, tag=None):
+        now = time.time()
+        blob = pickle.dumps(value)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at, tag) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, blob, now, now, tag),
+            )
+            self._evict(conn, now)
+
+    def tags(self):
+        # (key, tag) of every live entry that has a tag
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                f"SELECT key, tag FROM {self.table} WHERE tag IS NOT NULL AND created_at >= ?",
+                (time.time() - self.ttl if self.ttl else 0,),
+            ).fetchall()
+
+    def __contains__(self, key):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(f"SELECT created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row is not None and not (self.ttl and time.time() - row[0] > self.ttl)
+
+    def _evict(self, conn, now):
+        if self.ttl:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries:
+            conn.execute(
+                f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        with self._lock, self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -1,16 +1,26 @@
 import streamlit as st
 from google.oauth2 import service_account
+from resources import registry
+
+
+def get_config_value(key, default=None):
+    try:
+        return st.secrets["Config"][key]
+    except Exception as e:
+        return default
 
 
 class Credentials:
 
     def __init__(self):
-        self.GCP_credentials = self.get_VertexAI_credentials_from_secrets()
-        self.Firestore_credentials = self.get_Firestore_credentials_from_secrets()
+        # Service account keys are parsed once per process and shared, see resources.py
+        self.GCP_credentials = registry.get("VertexAI_credentials")
+        self.Firestore_credentials = registry.get("Firestore_credentials")
         self.TogetherAI_credentials = st.secrets["TogetherAI"]["api_key"]
         self.Mapbox_credentials = st.secrets["Mapbox"]["access_token"]
 
-    def get_Firestore_credentials_from_secrets(self):
+    @staticmethod
+    def get_Firestore_credentials_from_secrets():
         try:
             credentials_dict = {
                 "type": st.secrets["Firestore"]["type"],
@@ -37,7 +47,8 @@ class Credentials:
                 """)
             st.stop()
 
-    def get_VertexAI_credentials_from_secrets(self):
+    @staticmethod
+    def get_VertexAI_credentials_from_secrets():
         try:
             credentials_dict = {
                 "type": st.secrets["VertexAI"]["type"],
@@ -64,3 +75,7 @@ class Credentials:
                 - Please try again. If the problem persists, please contact the developer.
                 """)
             st.stop()
+
+
+registry.register("VertexAI_credentials", Credentials.get_VertexAI_credentials_from_secrets)
+registry.register("Firestore_credentials", Credentials.get_Firestore_credentials_from_secrets)
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from credentials import get_config_value
+from landmark_detection import GoogleCloudVision, MockGoogleCloudVision
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30
+
+
+class AsyncDetectionEngine:
+
+    def __init__(self, detector, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.detector = detector
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="landmark-detection")
+
+    async def find_landmark(self, image_data, timeout=None):
+        with self._lock:
+            self.queued += 1
+        # The detector raises on failure, st.stop would do nothing on the worker thread
+        future = self._executor.submit(self._run, image_data)
+        future.add_done_callback(self._on_done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    async def find_landmarks(self, images_data, timeout=None):
+        tasks = [self.find_landmark(image_data, timeout) for image_data in images_data]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def find_landmark_sync(self, image_data, timeout=None):
+        return asyncio.run(self.find_landmark(image_data, timeout))
+
+    def _run(self, image_data):
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        try:
+            return self.detector.find_landmark(image_data)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                # Cancelled before a worker picked it up, so it never left the queue
+                self.queued -= 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    @property
+    def queue_depth(self):
+        return self.queued
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "queue_depth": self.queued,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "max_concurrency": self.max_concurrency,
+            }
+
+    def shutdown(self, cancel_pending=True):
+        self._executor.shutdown(wait=False, cancel_futures=cancel_pending)
+
+
+@st.cache_resource(show_spinner=False)
+def get_detection_engine(debug=False):
+    detector = MockGoogleCloudVision() if debug else GoogleCloudVision()
+    return AsyncDetectionEngine(
+        detector,
+        max_concurrency=int(get_config_value("detection_max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+        timeout=float(get_config_value("detection_timeout", DEFAULT_TIMEOUT_SECONDS)),
+    )
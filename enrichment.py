@@ -0,0 +1,120 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import streamlit as st
+
+MAX_WORKERS = 16
+# Measured from the start of the enrichment, a dependent stage includes the wait for its dependency
+DEFAULT_STAGE_TIMEOUT_SECONDS = 20
+
+
+class DependencyFailed(Exception):
+    pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_enrichment_executor():
+    return ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="enrichment")
+
+
+def _copy_outcome(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+# Runs the post-detection stages of one upload (geocoding, summary, wiki, reviews) concurrently.
+# Stages still fresh in the pipeline are not recomputed, new results are stored back into it.
+# The page asks for each result in the order it renders them; a stage that misses its timeout
+# yields a default, keeps running and is picked up by the next rerun instead of being started again.
+# Stages run on pool threads, where st.stop and st.rerun do nothing: they must raise on failure,
+# errors are reported on the script thread by `result`.
+class Enrichment:
+
+    def __init__(self, pipeline, executor=None):
+        self.pipeline = pipeline
+        self.executor = executor or get_enrichment_executor()
+        self.started_at = time.monotonic()
+        self.timed_out = []
+        self.failed = []
+        self._stages = {}
+
+    def start(self,
+              name,
+              inputs,
+              compute,
+              timeout=DEFAULT_STAGE_TIMEOUT_SECONDS,
+              max_age=None,
+              after=None,
+              error=None):
+        # With `after`, the stage waits for that stage and `inputs` and `compute` are
+        # functions of its result. `error` is the (message, error code) shown when it fails.
+        future = Future()
+        self._stages[name] = {"future": future, "timeout": timeout, "error": error}
+        if after is None:
+            self._schedule(name, future, inputs, compute, max_age)
+            return future
+
+        def start_dependent(dependency):
+            if dependency.exception() is not None:
+                future.set_exception(DependencyFailed(after))
+                return
+            value = dependency.result()
+            self._schedule(name, future, inputs(value), lambda: compute(value), max_age)
+
+        self._stages[after]["future"].add_done_callback(start_dependent)
+        return future
+
+    def _schedule(self, name, future, inputs, compute, max_age):
+        found, value = self.pipeline.lookup(name, inputs, max_age)
+        if found:
+            future.set_result(value)
+            return
+        running = self.pipeline.running(name, inputs)
+        if running is not None:
+            running.add_done_callback(lambda done: _copy_outcome(done, future))
+            return
+        self.pipeline.track(name, inputs, future)
+        self.executor.submit(self._run, name, future, inputs, compute)
+
+    def _run(self, name, future, inputs, compute):
+        start = time.perf_counter()
+        try:
+            value = compute()
+        except Exception as e:
+            self.pipeline.untrack(name, future)
+            future.set_exception(e)
+            return
+        self.pipeline.store(name, inputs, value, time.perf_counter() - start)
+        self.pipeline.untrack(name, future)
+        future.set_result(value)
+
+    def result(self, name, default=None):
+        stage = self._stages[name]
+        remaining = self.started_at + stage["timeout"] - time.monotonic()
+        try:
+            return stage["future"].result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            self.timed_out.append(name)
+            return default
+        except DependencyFailed:
+            return default
+        except Exception as e:
+            self.failed.append(name)
+            if stage["error"] is not None:
+                message, code = stage["error"]
+                st.error(f"""
+                    ### Error: {message}
+                    - Error Code: {code}
+                    - Most likely, it's not your fault.
+                    - Please try again. If the problem persists, please contact the developer.
+                    """)
+            return default
+
+    def metrics(self):
+        return {
+            "elapsed_ms": round((time.monotonic() - self.started_at) * 1000, 1),
+            "pending": [name for name, stage in self._stages.items() if not stage["future"].done()],
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+        }
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from cache import DEFAULT_CACHE_DIR
+from resources import registry
+from review_schema import review_coordinates
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_ROWS_PER_FILE = 100000
+# Full and incremental exports walk the collection in different orders, so they never share a checkpoint
+CHECKPOINT_PATHS = {
+    "full": os.path.join(DEFAULT_CACHE_DIR, "export_reviews_full.json"),
+    "incremental": os.path.join(DEFAULT_CACHE_DIR, "export_reviews_incremental.json"),
+}
+
+
+def arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("DocumentId", pa.string()),
+        ("Username", pa.string()),
+        ("Landmark", pa.string()),
+        ("Coordinates", pa.string()),
+        ("Longitude", pa.float64()),
+        ("Latitude", pa.float64()),
+        ("Score10", pa.int64()),
+        ("Review", pa.string()),
+        ("CreatedAt", pa.timestamp("us", tz="UTC")),
+        ("WrittenAt", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def export_row(snapshot):
+    review_data = snapshot.to_dict()
+    try:
+        longitude, latitude = review_coordinates(review_data)
+    except Exception as e:
+        longitude, latitude = None, None
+    return {
+        "DocumentId": snapshot.id,
+        "Username": review_data.get("Username"),
+        "Landmark": review_data.get("Landmark"),
+        "Coordinates": review_data.get("Coordinates"),
+        "Longitude": longitude,
+        "Latitude": latitude,
+        "Score10": review_data.get("Score10"),
+        "Review": review_data.get("Review"),
+        "CreatedAt": review_data.get("CreatedAt"),
+        "WrittenAt": review_data.get("WrittenAt"),
+    }
+
+
+def iter_review_pages(client, page_size, after_document_id=None, since=None):
+    # Full exports walk the collection in document-id order, incremental ones in WrittenAt order.
+    # WrittenAt is the server time of the commit, unlike CreatedAt, which a queued review gets when
+    # it is submitted and can be older than reviews exported before it reached Firestore.
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    reviews_ref = client.collection("user_reviews")
+    if since is not None:
+        query = (reviews_ref.where(filter=FieldFilter("WrittenAt", ">", since)).order_by("WrittenAt").order_by(
+            "__name__"))
+    else:
+        query = reviews_ref.order_by("__name__")
+    cursor = reviews_ref.document(after_document_id).get() if after_document_id else None
+    while True:
+        page_query = query.limit(page_size)
+        if cursor is not None:
+            page_query = page_query.start_after(cursor)
+        snapshots = list(page_query.stream())
+        if not snapshots:
+            return
+        yield snapshots
+        if len(snapshots) < page_size:
+            return
+        cursor = snapshots[-1]
+
+
+# Part files are written under a temporary name and renamed once their footer is written,
+# so an interrupted export never leaves an unreadable .parquet file behind.
+class ParquetSink:
+
+    def __init__(self, directory, rows_per_file=DEFAULT_ROWS_PER_FILE):
+        import pyarrow.parquet as pq
+        self.pq = pq
+        self.schema = arrow_schema()
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.writer = None
+        self.rows_in_file = 0
+        os.makedirs(directory, exist_ok=True)
+        # Resumed exports add new part files next to the ones already written
+        self.part = len([name for name in os.listdir(directory) if name.endswith(".parquet")])
+
+    def write(self, rows):
+        import pyarrow as pa
+        if self.writer is None:
+            self.path = os.path.join(self.directory, f"part-{self.part:05d}.parquet")
+            self.writer = self.pq.ParquetWriter(f"{self.path}.tmp", self.schema)
+            self.part += 1
+            self.rows_in_file = 0
+        self.writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=self.schema))
+        self.rows_in_file += len(rows)
+        if self.rows_in_file >= self.rows_per_file:
+            self.close()
+
+    @property
+    def durable(self):
+        # Every row written so far is in a finished part file
+        return self.writer is None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(f"{self.path}.tmp", self.path)
+            self.writer = None
+
+
+class NDJSONSink:
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a")
+
+    def write(self, rows):
+        for row in rows:
+            row = dict(row, **{
+                field: row[field].isoformat() if row[field] is not None else None
+                for field in ("CreatedAt", "WrittenAt")
+            })
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    @property
+    def durable(self):
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+def load_checkpoint(path, mode, since=None):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {
+        "mode": mode,
+        "since": since,
+        "last_document_id": None,
+        "exported": 0,
+        # Where the next "--since last" export starts: for a full export the time it started, as it
+        # walks by document id and can miss reviews written meanwhile, else the newest WrittenAt
+        "watermark": since,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "completed": False,
+    }
+
+
+def save_checkpoint(path, checkpoint):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def resolve_checkpoint(args):
+    # "--since last" continues from the watermark of the previous full or incremental export
+    mode = "incremental" if args.since else "full"
+    path = args.checkpoint or CHECKPOINT_PATHS[mode]
+    if args.restart and os.path.exists(path):
+        os.remove(path)
+    if args.since != "last":
+        checkpoint = load_checkpoint(path, mode, args.since)
+        if checkpoint.get("completed") and checkpoint.get("since") != args.since:
+            return path, load_checkpoint(None, mode, args.since)
+        if checkpoint.get("mode", "full") != mode or checkpoint.get("since") != args.since:
+            raise SystemExit(f"Checkpoint {path} belongs to another export ({checkpoint.get('mode', 'full')}, since "
+                             f"{checkpoint.get('since')}), use --restart or another --checkpoint.")
+        return path, checkpoint
+    checkpoint = load_checkpoint(path, mode)
+    if checkpoint["last_document_id"] is not None and not checkpoint.get("completed"):
+        return path, checkpoint
+    previous = [checkpoint, load_checkpoint(CHECKPOINT_PATHS["full"], "full")]
+    since = max((previous_checkpoint.get("watermark") or "" for previous_checkpoint in previous
+                 if previous_checkpoint.get("completed")),
+                default="")
+    if not since:
+        raise SystemExit("No finished export to continue from, run a full export first.")
+    return path, load_checkpoint(None, mode, since)
+
+
+def export(args):
+    import firestore  # registers the Firestore client
+    path, checkpoint = resolve_checkpoint(args)
+    since = datetime.fromisoformat(checkpoint["since"]) if checkpoint["since"] else None
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if checkpoint.get("completed"):
+        print(f"Checkpoint {path} belongs to a finished export, use --restart to export again.")
+        return
+    sink = ParquetSink(args.output) if args.format == "parquet" else NDJSONSink(args.output)
+    start = time.monotonic()
+    exported = 0
+    progress = dict(checkpoint)
+    try:
+        pages = iter_review_pages(registry.get("firestore_client"), args.page_size, checkpoint["last_document_id"],
+                                  since)
+        for snapshots in pages:
+            rows = [export_row(snapshot) for snapshot in snapshots]
+            sink.write(rows)
+            exported += len(rows)
+            progress["last_document_id"] = snapshots[-1].id
+            progress["exported"] += len(rows)
+            if progress["mode"] == "incremental":
+                written = [row["WrittenAt"].isoformat() for row in rows if row["WrittenAt"] is not None]
+                progress["watermark"] = max([progress["watermark"] or ""] + written) or None
+            # The checkpoint only moves past rows that are in finished files
+            if sink.durable:
+                checkpoint = dict(progress)
+                save_checkpoint(path, checkpoint)
+            print(f"Exported {progress['exported']} reviews ({exported / (time.monotonic() - start):.0f} docs/s)")
+        if progress["mode"] == "full":
+            progress["watermark"] = progress["started_at"]
+        progress["completed"] = True
+    finally:
+        sink.close()
+        checkpoint = progress
+        save_checkpoint(path, checkpoint)
+    print(f"Done: {exported} reviews exported in this run, {checkpoint['exported']} in total, "
+          f"next incremental export starts at {checkpoint['watermark']}.")
+
+
+def iter_exported_batches(path):
+    # Reads the export back in bounded-size batches, never the whole dataset at once
+    if os.path.isdir(path):
+        import pyarrow.parquet as pq
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".parquet"):
+                for batch in pq.ParquetFile(os.path.join(path, name)).iter_batches(columns=["Landmark", "Score10"]):
+                    yield zip(batch.column("Landmark").to_pylist(), batch.column("Score10").to_pylist())
+    else:
+        with open(path) as f:
+            for line in f:
+                row = json.loads(line)
+                yield [(row["Landmark"], row["Score10"])]
+
+
+def leaderboard(args):
+    totals = {}
+    for batch in iter_exported_batches(args.input):
+        for landmark, score in batch:
+            if landmark is None or score is None:
+                continue
+            count, score_sum = totals.get(landmark, (0, 0))
+            totals[landmark] = (count + 1, score_sum + score)
+    ranked = [(landmark, count, score_sum / count)
+              for landmark, (count, score_sum) in totals.items()
+              if count >= args.min_reviews]
+    key = (lambda item: (item[2], item[1])) if args.by == "score" else (lambda item: (item[1], item[2]))
+    ranked.sort(key=key, reverse=True)
+    print(f"{'Rank':>4}  {'Reviews':>7}  {'Score':>5}  Landmark")
+    for rank, (landmark, count, average) in enumerate(ranked[:args.top], start=1):
+        print(f"{rank:>4}  {count:>7}  {average:>5.2f}  {landmark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream user_reviews to Parquet/NDJSON and rank landmarks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export reviews page by page.")
+    export_parser.add_argument("output", help="Directory of Parquet part files, or the NDJSON file to append to.")
+    export_parser.add_argument("--format", choices=["parquet", "ndjson"], default="parquet")
+    export_parser.add_argument("--since",
+                               help="Only reviews written to Firestore after this ISO timestamp (UTC if no offset), or "
+                               "\"last\" to continue where the previous export ended.")
+    export_parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    export_parser.add_argument("--checkpoint", help="File used to resume an export, one per mode by default.")
+    export_parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over.")
+    export_parser.set_defaults(handler=export)
+
+    leaderboard_parser = subparsers.add_parser("leaderboard", help="Rank landmarks from an export.")
+    leaderboard_parser.add_argument("input", help="Parquet export directory or NDJSON file.")
+    leaderboard_parser.add_argument("--by", choices=["reviews", "score"], default="reviews")
+    leaderboard_parser.add_argument("--min-reviews", type=int, default=1)
+    leaderboard_parser.add_argument("--top", type=int, default=20)
+    leaderboard_parser.set_defaults(handler=leaderboard)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
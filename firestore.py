@@ -1,15 +1,36 @@
+import os
+import time
+import hashlib
+from datetime import datetime, timezone
 from google.cloud import firestore
-from credentials import Credentials
+from google.cloud.firestore_v1.base_query import FieldFilter
+from credentials import Credentials, get_config_value
+from review_store import ReviewStore
+import geohash
+from trigram_index import TrigramIndex, trigrams
+from review_replica import ReviewReplica
+from review_schema import review_coordinates, coordinate_fields
+from resources import registry, grpc_channel_is_open
+from write_behind import ReviewWriteQueue
+from cache import DEFAULT_CACHE_DIR
 import streamlit as st
-from fuzzywuzzy import fuzz
 
+# Firestore caps the number of values in an "in" filter at 30
+MAX_IN_FILTER_VALUES = 30
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 500
+# Names added by other processes are picked up when the in-memory index is reloaded
+NAME_INDEX_REFRESH_SECONDS = 600
+REVIEWS_PAGE_SIZE = 10
+REVIEW_QUEUE_PATH = os.path.join(DEFAULT_CACHE_DIR, "review_queue.sqlite")
 
-class Firestore(Credentials):
+
+class Firestore(Credentials, ReviewStore):
 
     def __init__(self):
         super().__init__()
         try:
-            self.client = firestore.Client(credentials=self.Firestore_credentials)
+            registry.get("firestore_client")
         except Exception as e:
             st.error(f"""
                 ### Error: Invalid credentials.
@@ -20,15 +41,40 @@ class Firestore(Credentials):
                 - Please try again. If the problem persists, please contact the developer.
                 """)
             st.stop()
+        if get_config_value("review_write_behind", "False") == "True":
+            # Started with the store, so reviews queued before a restart are flushed without waiting for a new one
+            registry.get("review_write_queue")
+
+    @property
+    def client(self):
+        # Looked up per request: the store is shared by the whole process and outlives the
+        # client, which the registry rebuilds after an error or a failed health check
+        return registry.get("firestore_client")
+
+    def _review_replica(self):
+        # Until the initial snapshot has loaded, reads go to Firestore directly
+        if get_config_value("review_replica", "False") == "True":
+            replica = registry.get("review_replica")
+            if replica.is_ready:
+                return replica
+        return None
+
+    def review_replica_metrics(self):
+        replica = self._review_replica()
+        return replica.metrics() if replica is not None else None
 
     def get_all_reviews(self):
         try:
+            replica = self._review_replica()
+            if replica is not None:
+                return replica.all_reviews()
             reviews_ref = self.client.collection("user_reviews")
             reviews = []
             for review in reviews_ref.stream():
                 reviews.append(review.to_dict())
             return reviews
         except Exception as e:
+            registry.invalidate("firestore_client")
             st.error(f"""
                 ### Error: Failed to retrieve reviews.
                 - Error Code: 4x001
@@ -40,16 +86,20 @@ class Firestore(Credentials):
 
     def create_new_review(self, review, landmark, coordinates, score, username):
         try:
-            reviews_ref = self.client.collection("user_reviews")
-            review_data = {
-                "Username": username,
-                "Landmark": landmark,
-                "Coordinates": coordinates,
-                "Score10": score,
-                "Review": review,
+            new_review = {
+                "username": username,
+                "landmark": landmark,
+                "coordinates": coordinates,
+                "score": score,
+                "review": review,
             }
-            reviews_ref.document().set(review_data)
+            if get_config_value("review_write_behind", "False") == "True":
+                # Acknowledged once it is in the local queue, the worker commits it to Firestore
+                registry.get("review_write_queue").put(new_review)
+            else:
+                write_reviews(self.client, [new_review])
         except Exception as e:
+            registry.invalidate("firestore_client")
             st.error(f"""
                 ### Error: Failed to save new review.
                 - Error Code: 4x002
@@ -58,27 +108,370 @@ class Firestore(Credentials):
                 - Please try again. If the problem persists, please contact the developer.
                 """)
 
-    def get_review_for_landmark(self, long, lat, accuracy_range, landmark_name):
+    def get_review_for_landmark(self, long, lat, accuracy_range, landmark_name, limit=None):
         try:
-            reviews_ref = self.client.collection("user_reviews")
-            reviews = []
-            for review in reviews_ref.stream():
-                review_data = review.to_dict()
-                if (float(review_data["Coordinates"].split("/")[0]) <= long + accuracy_range and
-                        float(review_data["Coordinates"].split("/")[0]) >= long - accuracy_range and
-                        float(review_data["Coordinates"].split("/")[1]) <= lat + accuracy_range and
-                        float(review_data["Coordinates"].split("/")[1]) >= lat - accuracy_range or
-                        fuzz.ratio(review_data["Landmark"], landmark_name) >= 80):
-                    reviews.append(review_data)
+            return self.find_reviews_for_landmark(long, lat, accuracy_range, landmark_name, limit)
+        except Exception as e:
+            st.error(f"""
+                ### Error: Failed to retrieve reviews for landmark.
+                - Error Code: 4x003
+                - There may be issues with Firestore API.
+                - Most likely, it's not your fault.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return None
+
+    def _review_queries(self, long, lat, accuracy_range, landmark_name):
+        # One range query per geohash prefix covering the box, so only nearby documents are read, and one
+        # "in" query per chunk of fuzzy-matched names. Geohash matches still need the exact box check.
+        reviews_ref = self.client.collection("user_reviews")
+        queries = []
+        cells = geohash.covering_cells(lat - accuracy_range, long - accuracy_range, lat + accuracy_range,
+                                       long + accuracy_range)
+        for cell in cells:
+            queries.append((reviews_ref.where(filter=FieldFilter("Geohash", ">=", cell)).where(
+                filter=FieldFilter("Geohash", "<", cell + geohash.PREFIX_UPPER_BOUND)), True))
+        # The exact ratio only runs on names that share trigrams with the query
+        names = registry.get("landmark_name_index").matches(landmark_name) or [landmark_name]
+        for i in range(0, len(names), MAX_IN_FILTER_VALUES):
+            queries.append((reviews_ref.where(filter=FieldFilter("Landmark", "in", names[i:i + MAX_IN_FILTER_VALUES])),
+                            False))
+        return queries
+
+    def find_reviews_for_landmark(self, long, lat, accuracy_range, landmark_name, limit=None):
+        # With a limit, the newest `limit` reviews, so repeated reads return the same reviews
+        # and a new review always replaces the oldest one
+        try:
+            replica = self._review_replica()
+            if replica is not None:
+                reviews = replica.reviews_for_landmark(long, lat, accuracy_range, landmark_name) or []
+                if limit is not None:
+                    reviews = newest_reviews(reviews, limit)
+                return reviews or None
+            if limit is not None:
+                return self._newest_reviews(long, lat, accuracy_range, landmark_name, limit) or None
+            reviews = {}
+            for query, in_box_only in self._review_queries(long, lat, accuracy_range, landmark_name):
+                for review in query.stream():
+                    review_data = review.to_dict()
+                    if in_box_only and not _in_box(review_data, long, lat, accuracy_range):
+                        continue
+                    reviews[review.id] = review_data
             if reviews:
-                return reviews
+                return list(reviews.values())
             return None
         except Exception as e:
+            registry.invalidate("firestore_client")
+            raise
+
+    def _newest_reviews(self, long, lat, accuracy_range, landmark_name, limit):
+        # The newest `limit` matches of every query, merged. Covering cells are matched on the
+        # GeohashPrefixes array because a range filter on Geohash cannot be ordered by CreatedAt.
+        # Uses the composite indexes in firestore.indexes.json.
+        reviews_ref = self.client.collection("user_reviews")
+        cells = geohash.covering_cells(lat - accuracy_range, long - accuracy_range, lat + accuracy_range,
+                                       long + accuracy_range)
+        queries = [(reviews_ref.where(filter=FieldFilter("GeohashPrefixes", "array_contains_any", cells)), True)]
+        names = registry.get("landmark_name_index").matches(landmark_name) or [landmark_name]
+        for i in range(0, len(names), MAX_IN_FILTER_VALUES):
+            queries.append((reviews_ref.where(filter=FieldFilter("Landmark", "in", names[i:i + MAX_IN_FILTER_VALUES])),
+                            False))
+        reviews = {}
+        for query, in_box_only in queries:
+            query = query.order_by("CreatedAt", direction=firestore.Query.DESCENDING).limit(limit)
+            cursor = None
+            found = 0
+            # Cells reach outside the box, keep paging until `limit` reviews inside it are found
+            while found < limit:
+                snapshots = list((query.start_after(cursor) if cursor is not None else query).stream())
+                for snapshot in snapshots:
+                    review_data = snapshot.to_dict()
+                    if in_box_only and not _in_box(review_data, long, lat, accuracy_range):
+                        continue
+                    reviews[snapshot.id] = review_data
+                    found += 1
+                if len(snapshots) < limit:
+                    break
+                cursor = snapshots[-1]
+        return newest_reviews(list(reviews.values()), limit)
+
+    def get_reviews_page(self,
+                         long,
+                         lat,
+                         accuracy_range,
+                         landmark_name,
+                         cursor=None,
+                         page_size=REVIEWS_PAGE_SIZE,
+                         order_by="Score10"):
+        # Returns one page of reviews and the cursor for the next one (None on the last page).
+        # Firestore cannot order the union of the geohash and name queries, so the first call reads
+        # the ids and sort fields of all matching reviews and orders them here. The cursor holds the
+        # ids still to show, full documents are fetched one page at a time. The projection keeps the
+        # transfer small, but every match is still a billed read on the first page.
+        try:
+            if cursor is None:
+                cursor = self._ordered_review_ids(long, lat, accuracy_range, landmark_name, order_by)
+            page_ids = cursor[:page_size]
+            if not page_ids:
+                return [], None
+            reviews_ref = self.client.collection("user_reviews")
+            snapshots = {
+                snapshot.id: snapshot.to_dict()
+                for snapshot in self.client.get_all([reviews_ref.document(review_id) for review_id in page_ids])
+                if snapshot.exists
+            }
+            reviews = [snapshots[review_id] for review_id in page_ids if review_id in snapshots]
+            return reviews, cursor[page_size:] or None
+        except Exception as e:
+            registry.invalidate("firestore_client")
             st.error(f"""
                 ### Error: Failed to retrieve reviews for landmark.
-                - Error Code: 4x003
+                - Error Code: 4x005
+                - There may be issues with Firestore API.
+                - Most likely, it's not your fault.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return [], None
+
+    def _ordered_review_ids(self, long, lat, accuracy_range, landmark_name, order_by):
+        values = {}
+        for query, in_box_only in self._review_queries(long, lat, accuracy_range, landmark_name):
+            fields = [order_by, "Longitude", "Latitude", "Coordinates"] if in_box_only else [order_by]
+            for review in query.select(fields).stream():
+                review_data = review.to_dict()
+                if in_box_only and not _in_box(review_data, long, lat, accuracy_range):
+                    continue
+                values[review.id] = review_data.get(order_by)
+        ordered = sorted(values.items(),
+                         key=lambda item: (item[1] is not None, item[1] or 0, item[0]),
+                         reverse=True)
+        return tuple(review_id for review_id, _ in ordered)
+
+    def get_landmark_stats(self, landmark_name):
+        try:
+            names = registry.get("landmark_name_index").matches(landmark_name) or [landmark_name]
+            refs = [self.client.collection("landmark_stats").document(_landmark_name_id(name)) for name in names]
+            # Aggregated per landmark name: reviews in the area stored under another name are not counted
+            stats = {"Count": 0, "ScoreSum": 0, "Histogram": {}, "LastUpdated": None, "Landmarks": []}
+            for snapshot in self.client.get_all(refs):
+                if not snapshot.exists:
+                    continue
+                landmark_stats = snapshot.to_dict()
+                if not landmark_stats.get("Backfilled"):
+                    # Counts only reviews written since the aggregates were introduced, the
+                    # caller falls back to the reviews themselves until it is backfilled
+                    return None
+                stats["Landmarks"].append(landmark_stats.get("Landmark"))
+                stats["Count"] += landmark_stats.get("Count", 0)
+                stats["ScoreSum"] += landmark_stats.get("ScoreSum", 0)
+                for score, count in landmark_stats.get("Histogram", {}).items():
+                    stats["Histogram"][score] = stats["Histogram"].get(score, 0) + count
+                last_updated = landmark_stats.get("LastUpdated")
+                if last_updated is not None and (stats["LastUpdated"] is None or last_updated > stats["LastUpdated"]):
+                    stats["LastUpdated"] = last_updated
+            if stats["Count"]:
+                return stats
+            return None
+        except Exception as e:
+            registry.invalidate("firestore_client")
+            st.error(f"""
+                ### Error: Failed to retrieve review statistics for landmark.
+                - Error Code: 4x004
                 - There may be issues with Firestore API.
                 - Most likely, it's not your fault.
                 - Please try again. If the problem persists, please contact the developer.
                 """)
             return None
+
+
+
+def newest_reviews(reviews, limit):
+    # Reviews without CreatedAt count as the oldest, ties are broken by content so the pick is stable
+    ordered = sorted(reviews,
+                     key=lambda review: (review.get("CreatedAt") is not None, review.get("CreatedAt")
+                                         or 0, review.get("Username", ""), review.get("Review", "")),
+                     reverse=True)
+    return ordered[:limit]
+
+
+def _in_box(review_data, long, lat, accuracy_range):
+    review_long, review_lat = review_coordinates(review_data)
+    return (long - accuracy_range <= review_long <= long + accuracy_range and
+            lat - accuracy_range <= review_lat <= lat + accuracy_range)
+
+
+def rebuild_landmark_name_index(client):
+    # Full scan to seed landmark_names from reviews written before the index existed
+    names = {review.to_dict()["Landmark"] for review in client.collection("user_reviews").select(["Landmark"]).stream()}
+    names = sorted(names)
+    for i in range(0, len(names), MAX_BATCH_WRITES):
+        batch = client.batch()
+        for name in names[i:i + MAX_BATCH_WRITES]:
+            batch.set(client.collection("landmark_names").document(_landmark_name_id(name)), {
+                "Name": name,
+                "Trigrams": sorted(trigrams(name)),
+            })
+        batch.commit()
+    registry.invalidate("landmark_name_index")
+    return len(names)
+
+
+def rebuild_landmark_stats(client):
+    # Recounts every landmark from its reviews and marks the aggregates as complete. Each
+    # landmark is recounted in a transaction that reads its stats document, so a review
+    # committed meanwhile is either counted here or incremented on top, never both.
+    names = sorted({review.to_dict()["Landmark"] for review in client.collection("user_reviews").select(["Landmark"]).stream()})
+    for name in names:
+        _recount_landmark_stats(client.transaction(), client, name)
+    client.collection("landmark_stats_backfill").document("status").set({
+        "Completed": True,
+        "CompletedAt": firestore.SERVER_TIMESTAMP,
+    })
+    registry.invalidate("landmark_stats_backfilled")
+    return len(names)
+
+
+@firestore.transactional
+def _recount_landmark_stats(transaction, client, landmark):
+    stats_ref = client.collection("landmark_stats").document(_landmark_name_id(landmark))
+    transaction.get(stats_ref)
+    query = client.collection("user_reviews").where(filter=FieldFilter("Landmark", "==", landmark)).select(["Score10"])
+    stats = {"Count": 0, "ScoreSum": 0, "Histogram": {}}
+    for review in transaction.get(query):
+        score = review.to_dict()["Score10"]
+        stats["Count"] += 1
+        stats["ScoreSum"] += score
+        stats["Histogram"][str(score)] = stats["Histogram"].get(str(score), 0) + 1
+    transaction.set(stats_ref, {
+        "Landmark": landmark,
+        "LastUpdated": firestore.SERVER_TIMESTAMP,
+        "Backfilled": True,
+        **stats,
+    })
+
+
+def write_reviews(client, reviews):
+    # The reviews and their landmark aggregates are committed in one batch. Queued reviews carry
+    # their document id, those already written by an earlier attempt are skipped so a retried
+    # batch does not count them twice.
+    reviews_ref = client.collection("user_reviews")
+    queued_refs = [reviews_ref.document(new_review["id"]) for new_review in reviews if new_review.get("id")]
+    written = {snapshot.id for snapshot in client.get_all(queued_refs) if snapshot.exists} if queued_refs else set()
+    batch = client.batch()
+    scores = {}
+    for new_review in reviews:
+        if new_review.get("id") in written:
+            continue
+        batch.set(reviews_ref.document(new_review.get("id")), _review_document(new_review))
+        scores.setdefault(new_review["landmark"], []).append(new_review["score"])
+    if not scores:
+        return
+    for landmark, landmark_scores in scores.items():
+        _add_to_landmark_stats(client, batch, landmark, landmark_scores)
+    batch.commit()
+    for landmark in scores:
+        _index_landmark_name(client, landmark)
+
+
+def _review_document(new_review):
+    longitude, latitude = review_coordinates({"Coordinates": new_review["coordinates"]})
+    enqueued_at = new_review.get("enqueued_at")
+    return {
+        "Username": new_review["username"],
+        "Landmark": new_review["landmark"],
+        "Coordinates": new_review["coordinates"],
+        **coordinate_fields(longitude, latitude),
+        "Score10": new_review["score"],
+        "Review": new_review["review"],
+        # Queued reviews keep the time they were submitted, not the time they were flushed
+        "CreatedAt": (datetime.fromtimestamp(enqueued_at, tz=timezone.utc)
+                      if enqueued_at is not None else firestore.SERVER_TIMESTAMP),
+        # When the review reached Firestore, incremental exports continue from it
+        "WrittenAt": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def _add_to_landmark_stats(client, batch, landmark, scores):
+    histogram = {}
+    for score in scores:
+        histogram[str(score)] = histogram.get(str(score), 0) + 1
+    stats_ref = client.collection("landmark_stats").document(_landmark_name_id(landmark))
+    landmark_stats = {
+        "Landmark": landmark,
+        "Count": firestore.Increment(len(scores)),
+        "ScoreSum": firestore.Increment(sum(scores)),
+        "Histogram": {score: firestore.Increment(count) for score, count in histogram.items()},
+        "LastUpdated": firestore.SERVER_TIMESTAMP,
+    }
+    # Once the backfill has run, every landmark with older reviews has complete aggregates,
+    # so a stats document created from now on counts all of its reviews
+    if registry.get("landmark_stats_backfilled"):
+        landmark_stats["Backfilled"] = True
+    batch.set(stats_ref, landmark_stats, merge=True)
+
+
+def _index_landmark_name(client, landmark):
+    if registry.get("landmark_name_index").add(landmark):
+        client.collection("landmark_names").document(_landmark_name_id(landmark)).set({
+            "Name": landmark,
+            "Trigrams": sorted(trigrams(landmark)),
+        })
+
+
+def _landmark_name_id(landmark):
+    return hashlib.sha1(landmark.encode()).hexdigest()
+
+
+def _load_landmark_name_index():
+    client = registry.get("firestore_client")
+    return TrigramIndex(doc.to_dict()["Name"] for doc in client.collection("landmark_names").stream())
+
+
+def _landmark_stats_backfilled():
+    snapshot = registry.get("firestore_client").collection("landmark_stats_backfill").document("status").get()
+    return bool(snapshot.exists and snapshot.to_dict().get("Completed"))
+
+
+def _start_review_replica():
+    # Returned without waiting for the initial snapshot: the registry lock is held while a
+    # factory runs, and reads fall back to Firestore until the replica is ready
+    return ReviewReplica(
+        registry.get("firestore_client"),
+        bounded_memory=get_config_value("review_replica_bounded_memory", "False") == "True",
+    )
+
+
+def _start_review_write_queue():
+    return ReviewWriteQueue(
+        get_config_value("review_write_behind_path", REVIEW_QUEUE_PATH),
+        lambda reviews: write_reviews(registry.get("firestore_client"), reviews),
+    )
+
+
+registry.register(
+    "firestore_client",
+    lambda: firestore.Client(credentials=registry.get("Firestore_credentials")),
+    health_check=lambda client: grpc_channel_is_open(client._firestore_api.transport.grpc_channel),
+    depends_on=["Firestore_credentials"],
+)
+registry.register(
+    "landmark_name_index",
+    _load_landmark_name_index,
+    health_check=lambda index: time.monotonic() - index.created_at < NAME_INDEX_REFRESH_SECONDS,
+    depends_on=["firestore_client"],
+)
+registry.register(
+    "landmark_stats_backfilled",
+    _landmark_stats_backfilled,
+    # Re-read until the backfill has completed
+    health_check=lambda backfilled: backfilled,
+    depends_on=["firestore_client"],
+)
+registry.register(
+    "review_replica",
+    _start_review_replica,
+    health_check=lambda replica: replica.is_active,
+    depends_on=["firestore_client"],
+    close=lambda replica: replica.close(),
+)
+registry.register("review_write_queue", _start_review_write_queue)
@@ -0,0 +1,66 @@
+import time
+import pickle
+import hashlib
+from datetime import datetime, timezone
+from resources import registry
+import firestore  # registers the Firestore client
+
+DEFAULT_COLLECTION = "summary_cache"
+
+
+# Firestore backed key/value store with the interface of PersistentCache, shared by every
+# replica and kept across deploys. Entries expire after `ttl` seconds; expired documents are
+# deleted when they are read, or by a Firestore TTL policy on the ExpiresAt field. There is no
+# entry limit, the size is bounded by the TTL.
+class FirestoreCache:
+
+    def __init__(self, collection=DEFAULT_COLLECTION, ttl=None):
+        self.collection = collection
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def collection_ref(self):
+        # Looked up per call, the registry rebuilds the client after an error
+        return registry.get("firestore_client").collection(self.collection)
+
+    def _document(self, key):
+        # Keys are arbitrary strings, document ids must not contain "/"
+        return self.collection_ref.document(hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _read(self, key):
+        snapshot = self._document(key).get()
+        if not snapshot.exists:
+            return None
+        entry = snapshot.to_dict()
+        if self.ttl and time.time() - entry["CreatedAt"] > self.ttl:
+            snapshot.reference.delete()
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        entry = self._read(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(entry["Value"])
+
+    def set(self, key, value):
+        now = time.time()
+        entry = {"Key": key, "Value": pickle.dumps(value), "CreatedAt": now}
+        if self.ttl:
+            entry["ExpiresAt"] = datetime.fromtimestamp(now + self.ttl, tz=timezone.utc)
+        self._document(key).set(entry)
+
+    def __contains__(self, key):
+        return self._read(key) is not None
+
+    def __len__(self):
+        return self.collection_ref.count().get()[0][0].value
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
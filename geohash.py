@@ -0,0 +1,71 @@
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+DEFAULT_PRECISION = 9
+MAX_COVERING_CELLS = 8
+# Sorts after every base32 character, so [cell, cell + "~") is every hash with that prefix
+PREFIX_UPPER_BOUND = "~"
+
+
+def encode(lat, lon, precision=DEFAULT_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    lat = min(max(lat, -90.0), 90.0)
+    lon = min(max(lon, -180.0), 180.0)
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value_range, value = (lon_range, lon) if even else (lat_range, lat)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            value_range[0] = middle
+        else:
+            bits = bits << 1
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def prefixes(geohash):
+    return [geohash[:length] for length in range(len(geohash) + 1)]
+
+
+def cell_size(precision):
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVERING_CELLS):
+    # Finest precision whose cells cover the box in at most `max_cells` prefixes
+    for precision in range(DEFAULT_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        if ((max_lat - min_lat) / lat_step + 2) * ((max_lon - min_lon) / lon_step + 2) > 4 * max_cells:
+            continue
+        cells = _cells_in_box(min_lat, min_lon, max_lat, max_lon, precision)
+        if len(cells) <= max_cells:
+            return cells
+    return [""]
+
+
+def _cells_in_box(min_lat, min_lon, max_lat, max_lon, precision):
+    lat_step, lon_step = cell_size(precision)
+    cells = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.add(encode(lat, lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + lon_step, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + lat_step, max_lat)
+    return sorted(cells)
@@ -1,15 +1,36 @@
 import streamlit as st
-from PIL import Image as Img
 import base64
-import time
-from mapping import FoliumMap
-from landmark_detection import GoogleCloudVision, MockGoogleCloudVision
-from ai_summary import MockOpenAI_LLM, AI_Summary
-from firestore import Firestore
-from streamlit_folium import st_folium
+from datetime import datetime, timezone
+from pipeline import get_pipeline
 
 SUPPORTED_FORMATS = ["png", "jpg", "jpeg", "webp"]
 DEBUG_MODE_WARNING_ENABLED = True
+# Reviews written by other users show up after this long without a new upload
+REVIEWS_MAX_AGE_SECONDS = 60
+OWN_REVIEWS_SESSION_KEY = "own_reviews"
+
+
+def mask_username(username):
+    words = username.split()
+    masked_words = []
+    for word in words:
+        if len(word) > 3:
+            masked_word = (word[:2] + "\\*" * (len(word) - 3) + word[-1])
+        else:
+            masked_word = word
+        masked_words.append(masked_word)
+    return " ".join(masked_words)
+
+
+def merge_own_reviews(reviews, landmark):
+    # Reviews this session submitted that the backend does not return yet go first
+    reviews = list(reviews or [])
+    seen = {(review["Username"], review["Review"]) for review in reviews}
+    own_reviews = [
+        review for review in st.session_state.get(OWN_REVIEWS_SESSION_KEY, [])
+        if review["Landmark"] == landmark and (review["Username"], review["Review"]) not in seen
+    ]
+    return (own_reviews + reviews) or None
 
 
 class Landmarker:
@@ -17,10 +38,11 @@ class Landmarker:
     def __init__(self, debug=False):
         super().__init__()
         self.debug = debug
-        self.gc = self.init_google_cloud_vision()
-        self.fm = self.init_folium_map()
-        self.summarizer = self.init_TogetherAI()
-        self.firestore_connection = self.init_firestore()
+        # Everything below is built on first use, so Vision, TogetherAI, Firestore and the
+        # mapping libraries are not imported before the feature that needs them is reached
+        self._detection_engine = None
+        self._summarizer = None
+        self._firestore_connection = None
         self.set_page_config()
         st.html(
             """
@@ -38,23 +60,47 @@ class Landmarker:
         }
         """,)
 
+    @property
+    def detection_engine(self):
+        if self._detection_engine is None:
+            self._detection_engine = self.init_google_cloud_vision()
+        return self._detection_engine
+
+    @property
+    def gc(self):
+        return self.detection_engine.detector
+
+    @property
+    def summarizer(self):
+        if self._summarizer is None:
+            self._summarizer = self.init_TogetherAI()
+        return self._summarizer
+
+    @property
+    def firestore_connection(self):
+        if self._firestore_connection is None:
+            self._firestore_connection = self.init_firestore()
+        return self._firestore_connection
+
     def init_google_cloud_vision(self):
-        if self.debug:
-            return MockGoogleCloudVision()
-        else:
-            return GoogleCloudVision()
+        from detection_engine import get_detection_engine
+        return get_detection_engine(self.debug)
 
     def init_TogetherAI(self):
         if self.debug:
+            from ai_summary import MockOpenAI_LLM
             return MockOpenAI_LLM()
         else:
+            from ai_summary import AI_Summary
             return AI_Summary()
 
     def init_folium_map(self):
+        from mapping import FoliumMap
         return FoliumMap()
 
     def init_firestore(self):
-        return Firestore()
+        from review_store import get_review_store
+        return get_review_store()
 
     def set_page_config(self):
         st.set_page_config(
@@ -129,10 +175,18 @@ This app uses Google Cloud Vision to detect landmarks in images.
 - Google Cloud Vision can identify many famous landmarks, like the Eiffel Tower or the Grand Canyon. If you're not sure what to upload, try starting with a picture of a well-known landmark.
 We hope you enjoy using the Landmark Detection App!
 """)
-        gc = self.gc
-        fm = self.fm
         with st.sidebar.container(border=True):
             camera = st.toggle(label="Camera", value=False, help="Switch on the camera.")
+            batch_mode = st.toggle(
+                label="Batch Mode",
+                value=False,
+                help="Upload many images at once and detect the landmarks in all of them.",
+                disabled=camera,
+            )
+        if batch_mode and not camera:
+            self.batch_detection()
+            self.footer()
+            return
         if camera:
             st.warning("""
                 ### Privacy Warning: Camera is on.
@@ -175,6 +229,7 @@ We hope you enjoy using the Landmark Detection App!
                     - Please try again. If the problem persists, please contact the developer.
                     """)
         if uploaded_file is not None:
+            from PIL import Image as Img
             image = Img.open(uploaded_file)
             with st.sidebar.status("Processing the image...", expanded=False) as status:
                 st.image(
@@ -202,40 +257,27 @@ We hope you enjoy using the Landmark Detection App!
         lat_most_matched = 0
         lon_most_matched = 0
         if uploaded_file is not None:
-            landmarks = gc.find_landmark(uploaded_file)
+            pipeline = get_pipeline(uploaded_file)
+            landmarks, preprocessing = pipeline.stage("detection", (), lambda: self.detect_landmarks(uploaded_file))
+            if self.debug:
+                st.sidebar.json(self.detection_engine.metrics(), expanded=False)
+                st.sidebar.json({name: f"{seconds * 1000:.1f} ms" for name, seconds in pipeline.timings.items()},
+                                expanded=False)
+            if preprocessing is not None and preprocessing.bytes_before:
+                saved = 100 * (1 - preprocessing.bytes_after / preprocessing.bytes_before)
+                st.sidebar.caption(
+                    f"_Image size: {preprocessing.bytes_before / 1024:.0f} KB → {preprocessing.bytes_after / 1024:.0f} KB sent to Vision ({saved:.0f}% saved)_"
+                )
             for landmark in landmarks:
                 landmark_name = landmark.description
-                confidence = "Matched: " + str(round(landmark.score * 100, 2)) + "%"
                 lat = landmark.locations[0].lat_lng.latitude
                 lon = landmark.locations[0].lat_lng.longitude
-                fm.add_marker(lat, lon, landmark_name, confidence)
-                fm.add_heatmap(lat, lon, landmark.score)
                 if landmark.score > landmark_most_matched_score:
                     landmark_most_matched_score = landmark.score
                     landmark_most_matched = landmark_name
                     lat_most_matched = lat
                     lon_most_matched = lon
-            try:
-                map_html = fm.map._repr_html_()
-            except Exception as e:
-                st.error(f"""
-                    ### Error: Map could not loaded.
-                    - Error Code: 1x002
-                    - Most likely, it's not your fault.
-                    - Please try again. If the problem persists, please contact the developer.
-                    """)
-                st.stop()
-            try:
-                fm.map.fit_bounds(fm.map.get_bounds(), padding=[40, 40], max_zoom=17)
-            except Exception as e:
-                st.warning(f"""
-                    ### Error: Map could not be adjusted.
-                    - Error Code: 1x003
-                    - Most likely, it's not your fault.
-                    - Please try again, or zoom out a bit to see the whole map.
-                    - You can also rerun the app to see if the problem persists.
-                    - If the problem persists, please contact the developer.
-                    """)
+            fm, map_html = pipeline.stage("map", (), lambda: self.build_map(landmarks))
             if landmarks:
                 a = """ - **Zoom out to see the whole map, or just download it.**"""
                 b = """ - **Click on the markers to see the landmark name and similarity score.**"""
@@ -264,18 +306,21 @@ We hope you enjoy using the Landmark Detection App!
                             "Stream Summary",
                             False,
                             help=
-                            "Switch on for streaming the summary as it's being generated. It bypasses the caching and get fresh summary in real-time.",
+                            "Switch on for streaming the summary as it's being generated. Cached summaries are replayed instantly, new ones are cached once complete.",
                         )
                     if stream_mode:
                         st.session_state["summary_stream"] = True
                     else:
                         st.session_state["summary_stream"] = None
-                _ = fm.satellite_map() if satellite_mode else None
+                fm.set_satellite_mode(satellite_mode)
             else:
                 pass
             PREVIOUS_CITY_COUNTRY = ("Kövsər Dönər", "28 May")
             if landmarks:
-                city, country = fm.get_city_country(lat, lon)
+                # Geocoding, summary, wiki and reviews run concurrently, each section waits only for its own result
+                enrichment = self.start_enrichment(pipeline, fm, landmark_most_matched, (lat, lon),
+                                                   (lat_most_matched, lon_most_matched))
+                city, country = enrichment.result("location", (None, None))
                 if city and country:
                     if (city, country) != PREVIOUS_CITY_COUNTRY:
                         with st.status("**Identifying the location...**", expanded=False) as status:
@@ -288,15 +333,24 @@ We hope you enjoy using the Landmark Detection App!
                                 expanded=True,
                             )
                             try:
-                                prompt = f"Craft a professional and concise 80-word summary about {landmark_most_matched} in {city}, {country}. Include the origin of its name, historical significance, and cultural impact. Share fascinating facts that make it a must-visit for tourists."
                                 if st.session_state.get("summary_stream") is not None:
-                                    st.write_stream(self.summarizer.stream_summary(prompt))
-                                    time.sleep(0.10)
+                                    st.write_stream(
+                                        self.summarizer.stream_landmark_summary(landmark_most_matched, city, country))
+                                    if self.debug:
+                                        st.sidebar.json(self.summarizer.stream_timings, expanded=False)
                                 else:
                                     with st.spinner("Generating LLM Based Summary..."):
-                                        summary = self.summarizer.generate_summary(prompt)
-                                        # write summary in bold
-                                        st.markdown(f"**{str(summary).strip()}**")
+                                        summary = enrichment.result("summary")
+                                        if summary is not None:
+                                            # write summary in bold
+                                            st.markdown(f"**{str(summary).strip()}**")
+                                        elif "summary" in enrichment.timed_out:
+                                            st.info("- The summary is taking longer than usual, it will be shown on the next refresh.")
+                                    if hasattr(self.summarizer, "summary_cache_metrics"):
+                                        cache_metrics = self.summarizer.summary_cache_metrics()
+                                        st.sidebar.caption(
+                                            f"_Summary cache: {cache_metrics['entries']} entries, {cache_metrics['hit_ratio']:.0%} hit ratio_"
+                                        )
                                 st.warning("""
                                     ###### The LLM Based Summary is generated by the AI model.
                                     - The summary may not be accurate, please verify the information before using it.
@@ -326,7 +380,7 @@ We hope you enjoy using the Landmark Detection App!
                         url=f"https://www.google.com/maps/search/?api=1&query={lat},{lon}",
                         use_container_width=True,
                     )
-                wiki_url = (fm.get_wikipedia_page(landmark_most_matched) or
+                wiki_url = (enrichment.result("wiki") or
                             f"https://www.google.com/search?q={landmark_most_matched} wikipedia&btnI")
                 with col2:
                     st.link_button(
@@ -353,6 +407,7 @@ We hope you enjoy using the Landmark Detection App!
                         > boop-beep-boop...
                         """)
                 with st.status("Loading the map...", expanded=False) as status:
+                    from streamlit_folium import st_folium
                     with st.container(height=460):
                         st_folium(
                             fm.map,
@@ -369,7 +424,16 @@ We hope you enjoy using the Landmark Detection App!
                     ## Reviews:
                     """)
                 with st.spinner("Loading reviews..."):
-                    reviews = self.firestore_connection.get_review_for_landmark(lon, lat, 0.1, landmark_most_matched)
+                    reviews = enrichment.result("reviews")
+                    if "reviews" in enrichment.timed_out:
+                        st.info("- Reviews are taking longer than usual, they will be shown on the next refresh.")
+                    reviews = merge_own_reviews(reviews, landmark_most_matched)
+                    if self.debug:
+                        st.sidebar.json(enrichment.metrics(), expanded=False)
+                    if self.debug and hasattr(self.firestore_connection, "review_replica_metrics"):
+                        replica_metrics = self.firestore_connection.review_replica_metrics()
+                        if replica_metrics is not None:
+                            st.sidebar.json(replica_metrics, expanded=False)
                     # Button to add a review
                     with st.expander("**Click here to write a review.**"):
                         with st.form(key="add_review_form"):
@@ -393,31 +457,49 @@ We hope you enjoy using the Landmark Detection App!
                                     score,
                                     username,
                                 )
+                                # Shown to this session right away, even before a queued write reaches Firestore
+                                st.session_state.setdefault(OWN_REVIEWS_SESSION_KEY, []).append({
+                                    "Username": username,
+                                    "Landmark": landmark_most_matched,
+                                    "Coordinates": f"{lon}/{lat}",
+                                    "Score10": score,
+                                    "Review": review,
+                                    "CreatedAt": datetime.now(timezone.utc),
+                                })
                                 st.success("- Review added successfully.")
+                                pipeline.invalidate("reviews")
+                                pipeline.invalidate("review_stats")
+                                pipeline.invalidate("review_pages")
                                 st.rerun()
                             else:
                                 st.warning("- Please fill in all the fields.")
                     with st.expander("**Click here to see the reviews for this landmark.**"):
-                        if reviews:
-                            for review in reviews:
-
-                                def mask_username(username):
-                                    words = username.split()
-                                    masked_words = []
-                                    for word in words:
-                                        if len(word) > 3:
-                                            masked_word = (word[:2] + "\\*" * (len(word) - 3) + word[-1])
-                                        else:
-                                            masked_word = word
-                                        masked_words.append(masked_word)
-                                    return " ".join(masked_words)
-
+                        # Pages loaded so far live in the pipeline, "Load more" appends the next one
+                        review_location = (lat_most_matched, lon_most_matched)
+                        review_pages = pipeline.stage("review_pages", (landmark_most_matched, review_location),
+                                                      lambda: {
+                                                          "reviews": [],
+                                                          "cursor": None,
+                                                          "exhausted": False,
+                                                      })
+                        if not review_pages["reviews"] and not review_pages["exhausted"]:
+                            self.load_reviews_page(review_pages, landmark_most_matched, review_location)
+                        page_reviews = merge_own_reviews(review_pages["reviews"], landmark_most_matched)
+                        if page_reviews:
+                            for review in page_reviews:
                                 st.markdown(f"##### {mask_username(review['Username'])}")
                                 st.markdown(
                                     f""" {"**Excellent**" if review['Score10'] >= 9 else "**Good**" if review['Score10'] >= 7 else "**Average**" if review['Score10'] >= 5 else "**Poor**" if review['Score10'] >= 3 else "**Terrible**"} ({"⭐" * 1 if review['Score10'] <= 2 else "⭐" * 2 if review['Score10'] <= 4 else "⭐" * 3 if review['Score10'] <= 6 else "⭐" * 4 if review['Score10'] <= 8 else "⭐" * 5})"""
                                 )
                                 st.markdown(f"> {review['Review']}")
                                 st.markdown("---")
+                            if not review_pages["exhausted"]:
+                                st.button(
+                                    "Load more reviews",
+                                    key="load_more_reviews",
+                                    on_click=self.load_reviews_page,
+                                    args=(review_pages, landmark_most_matched, review_location),
+                                )
                         else:
                             st.write("""
                                 - No reviews yet. Be the first one to review this landmark!
@@ -427,10 +509,33 @@ We hope you enjoy using the Landmark Detection App!
                             expanded=True,
                     ):
                         if reviews:
-                            prompt = f"Craft a professional and concise 2-3 sentence review summary about {landmark_most_matched} in {city}, {country} considering the reviews: {', '.join([r['Review'] for r in reviews])}. Focus on verifiable information and avoid claims without evidence (e.g., rumors, speculation). At the end mention unverifiable/unrelated claims if any."
-                            summary = self.summarizer.summarize_review(prompt)
+                            summary = pipeline.stage(
+                                "review_summary",
+                                (landmark_most_matched, city, country, tuple(r["Review"] for r in reviews)),
+                                lambda: self.summarizer.review_summary(landmark_most_matched, city, country, reviews),
+                            )
                             summary = str(summary).strip()
-                            st.write(f"Overall Score: {round(sum([r['Score10'] for r in reviews])/len(reviews), 2)}")
+                            stats = pipeline.stage(
+                                "review_stats",
+                                (landmark_most_matched,),
+                                lambda: self.firestore_connection.get_landmark_stats(landmark_most_matched),
+                                max_age=REVIEWS_MAX_AGE_SECONDS,
+                            )
+                            if stats:
+                                # Aggregated per name, nearby reviews under other names are listed but not counted
+                                st.write(f"Overall Score: {round(stats['ScoreSum'] / stats['Count'], 2)}")
+                                st.caption(f"Based on {stats['Count']} reviews named "
+                                           f"{', '.join(sorted(name for name in stats['Landmarks'] if name))}, "
+                                           "reviews of nearby places under other names are not counted.")
+                                self.show_star_distribution(stats["Histogram"], stats["Count"])
+                            else:
+                                from review_store import SUMMARY_MAX_REVIEWS
+                                average = round(sum([r['Score10'] for r in reviews]) / len(reviews), 2)
+                                if len(reviews) >= SUMMARY_MAX_REVIEWS:
+                                    # Only the newest reviews are loaded for the summary
+                                    st.write(f"Overall Score (latest {len(reviews)} reviews): {average}")
+                                else:
+                                    st.write(f"Overall Score: {average}")
                             st.write(f"""
                                 > **{summary}**
                                 """)
@@ -451,6 +556,185 @@ We hope you enjoy using the Landmark Detection App!
                     - The landmark is not famous enough.
                     - The image is not clear enough.
                     """)
+        self.footer()
+
+    def detect_landmarks(self, uploaded_file):
+        from landmark_detection import LandmarkDetectionError
+        try:
+            landmarks, preprocessing = self.detection_engine.find_landmark_sync(uploaded_file)
+        except LandmarkDetectionError as e:
+            self.show_detection_error(e)
+        except TimeoutError as e:
+            st.error(f"""
+                ### Error: Landmark detection timed out.
+                - Error Code: 1x006
+                - There may be issues with Google Cloud Vision API or the server is busy.
+                - Most likely, it's not your fault.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            st.stop()
+        return landmarks, preprocessing
+
+    def show_detection_error(self, error):
+        st.error(f"""
+            Error: {error.__cause__}
+            ### Error: {error}
+            - Error Code: {error.code}
+            - There may be issues with Google Cloud Vision API, or with the uploaded image.
+            - Please make sure the image is in one of the supported formats (png, jpg, jpeg, webp).
+            - Please try again. If the problem persists, please contact the developer.
+            """)
+        st.stop()
+
+    def start_enrichment(self, pipeline, fm, landmark, location, review_location):
+        from enrichment import Enrichment, DEFAULT_STAGE_TIMEOUT_SECONDS
+        from credentials import get_config_value
+        from review_store import reviews_for_summary
+        timeout = float(get_config_value("enrichment_timeout", DEFAULT_STAGE_TIMEOUT_SECONDS))
+        # Clients are created here, not lazily from the worker threads. The stages call the
+        # variants that raise on failure, Enrichment.result reports the error on the script thread.
+        summarizer = self.summarizer
+        review_store = self.firestore_connection
+        enrichment = Enrichment(pipeline)
+        lat, lon = location
+        enrichment.start(
+            "location",
+            (lat, lon),
+            lambda: fm.find_city_country(lat, lon),
+            timeout,
+            error=("Location details could not be retrieved.", "2x003"),
+        )
+        if st.session_state.get("summary_stream") is None:
+            enrichment.start(
+                "summary",
+                lambda place: (landmark, *place),
+                lambda place: summarizer.landmark_summary(landmark, *place) if all(place) else None,
+                timeout,
+                after="location",
+                error=("LLM Based Summary could not be generated.", "1x004"),
+            )
+        # Without a Wikipedia page the button falls back to a search, no error is shown
+        enrichment.start("wiki", (landmark,), lambda: fm.find_wikipedia_page(landmark), timeout)
+        review_lat, review_lon = review_location
+        enrichment.start(
+            "reviews",
+            (review_lon, review_lat, landmark),
+            lambda: reviews_for_summary(review_store, review_lon, review_lat, landmark),
+            timeout,
+            max_age=REVIEWS_MAX_AGE_SECONDS,
+            error=("Failed to retrieve reviews for landmark.", "1x007"),
+        )
+        return enrichment
+
+    def build_map(self, landmarks):
+        fm = self.init_folium_map()
+        for landmark in landmarks:
+            confidence = "Matched: " + str(round(landmark.score * 100, 2)) + "%"
+            lat = landmark.locations[0].lat_lng.latitude
+            lon = landmark.locations[0].lat_lng.longitude
+            fm.add_marker(lat, lon, landmark.description, confidence)
+            fm.add_heatmap(lat, lon, landmark.score)
+        try:
+            map_html = fm.map._repr_html_()
+        except Exception as e:
+            st.error(f"""
+                ### Error: Map could not loaded.
+                - Error Code: 1x002
+                - Most likely, it's not your fault.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            st.stop()
+        try:
+            fm.map.fit_bounds(fm.map.get_bounds(), padding=[40, 40], max_zoom=17)
+        except Exception as e:
+            st.warning(f"""
+                ### Error: Map could not be adjusted.
+                - Error Code: 1x003
+                - Most likely, it's not your fault.
+                - Please try again, or zoom out a bit to see the whole map.
+                - You can also rerun the app to see if the problem persists.
+                - If the problem persists, please contact the developer.
+                """)
+        return fm, map_html
+
+    def load_reviews_page(self, review_pages, landmark, review_location):
+        from review_store import REVIEW_ACCURACY_RANGE
+        lat, lon = review_location
+        reviews, cursor = self.firestore_connection.get_reviews_page(lon,
+                                                                     lat,
+                                                                     REVIEW_ACCURACY_RANGE,
+                                                                     landmark,
+                                                                     cursor=review_pages["cursor"])
+        review_pages["reviews"].extend(reviews)
+        review_pages["cursor"] = cursor
+        review_pages["exhausted"] = cursor is None
+
+    def show_star_distribution(self, histogram, count):
+        # Scores out of 10 map to stars the same way as in the review list
+        stars = {star: 0 for star in range(5, 0, -1)}
+        for score, score_count in histogram.items():
+            stars[min(5, (int(score) + 1) // 2)] += score_count
+        for star, star_count in stars.items():
+            st.write(f"{'⭐' * star} — {star_count} ({round(100 * star_count / count)}%)")
+
+    def batch_detection(self):
+        try:
+            with st.sidebar.expander("_Please upload images of **landmarks**._", expanded=True):
+                uploaded_files = st.file_uploader(
+                    type=SUPPORTED_FORMATS,
+                    accept_multiple_files=True,
+                    help="Upload images of landmarks.",
+                    label_visibility="collapsed",
+                    label="Upload Images",
+                )
+        except Exception as e:
+            st.warning(f"""
+                ### Error: Images could not be uploaded.
+                - Error Code: 1x005
+                - There may be issues with your images.
+                - Please make sure the images are in one of the supported formats (png, jpg, jpeg, webp).
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return
+        if not uploaded_files:
+            with st.expander("_**Click here to toggle the help view**_", expanded=True):
+                st.markdown("""
+                    ### Instructions:
+                    - _**Upload** one or more images of landmarks using the upload **widget** on the sidebar._
+                    - _Results appear below as soon as each batch of images is processed._
+                    """)
+            return
+        progress = st.progress(0.0, text=f"Detecting landmarks in {len(uploaded_files)} images...")
+        # One placeholder per upload keeps the results in upload order while batches finish
+        placeholders = [st.empty() for _ in uploaded_files]
+        from landmark_detection import LandmarkDetectionError
+        try:
+            self.show_batch_results(uploaded_files, placeholders, progress)
+        except LandmarkDetectionError as e:
+            self.show_detection_error(e)
+
+    def show_batch_results(self, uploaded_files, placeholders, progress):
+        from PIL import Image as Img
+        for done, (index, landmarks) in enumerate(self.gc.find_landmarks_batch(uploaded_files), start=1):
+            uploaded_file = uploaded_files[index]
+            with placeholders[index].container(border=True):
+                col1, col2 = st.columns([1, 3])
+                with col1:
+                    st.image(Img.open(uploaded_file), use_column_width=True)
+                with col2:
+                    st.markdown(f"##### {uploaded_file.name}")
+                    if landmarks:
+                        for landmark in landmarks:
+                            lat = landmark.locations[0].lat_lng.latitude
+                            lon = landmark.locations[0].lat_lng.longitude
+                            st.markdown(
+                                f"- **{landmark.description}** ({round(landmark.score * 100, 2)}%) - [Google Maps](https://www.google.com/maps/search/?api=1&query={lat},{lon})"
+                            )
+                    else:
+                        st.markdown("- _No landmarks detected._")
+            progress.progress(done / len(uploaded_files), text=f"Processed {done} of {len(uploaded_files)} images.")
+
+    def footer(self):
         for i in range(4):
             st.write("")
         footer = """
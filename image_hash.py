@@ -0,0 +1,100 @@
+import io
+import threading
+import numpy as np
+from PIL import Image as Img
+
+HASH_SIZE = 8
+DEFAULT_DISTANCE_THRESHOLD = 6
+
+
+def dhash(content, hash_size=HASH_SIZE):
+    try:
+        image = Img.open(io.BytesIO(content))
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        image = image.convert("L").resize((hash_size + 1, hash_size), Img.LANCZOS)
+    except Exception as e:
+        return None
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, key, value):
+        node = self.root
+        if node is None:
+            self.root = (key, value, {})
+            self.size += 1
+            return
+        while True:
+            distance = hamming_distance(key, node[0])
+            if distance == 0:
+                return
+            children = node[2]
+            if distance not in children:
+                children[distance] = (key, value, {})
+                self.size += 1
+                return
+            node = children[distance]
+
+    def search(self, key, max_distance):
+        results = []
+        if self.root is None:
+            return results
+        candidates = [self.root]
+        while candidates:
+            node = candidates.pop()
+            distance = hamming_distance(key, node[0])
+            if distance <= max_distance:
+                results.append((distance, node[1]))
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    candidates.append(child)
+        return sorted(results, key=lambda result: result[0])
+
+    def __len__(self):
+        return self.size
+
+
+class NearDuplicateIndex:
+
+    def __init__(self, threshold=DEFAULT_DISTANCE_THRESHOLD):
+        self.threshold = threshold
+        self.tree = BKTree()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def add(self, image_hash, key):
+        with self._lock:
+            self.tree.add(image_hash, key)
+
+    def candidates(self, image_hash):
+        # Keys of the indexed images within the threshold, closest first. Their cache entries
+        # may have been evicted since, so the caller reports the outcome with `record`.
+        with self._lock:
+            return [key for _, key in self.tree.search(image_hash, self.threshold)]
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
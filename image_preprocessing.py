@@ -0,0 +1,82 @@
+import io
+from collections import namedtuple
+from PIL import Image as Img, ImageOps
+
+DEFAULT_MAX_EDGE = 1600
+DEFAULT_QUALITY = 85
+DEFAULT_FORMAT = "JPEG"
+SUPPORTED_OUTPUT_FORMATS = ["JPEG", "WEBP"]
+EXIF_ORIENTATION_TAG = 0x0112
+JPEG_START_OF_SCAN = 0xDA
+JPEG_APP1 = 0xE1
+
+PreprocessedImage = namedtuple("PreprocessedImage", ["content", "bytes_before", "bytes_after"])
+
+
+class ImagePreprocessor:
+
+    def __init__(self, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, image_format=DEFAULT_FORMAT):
+        self.max_edge = max_edge
+        self.quality = quality
+        self.image_format = image_format.upper() if image_format.upper() in SUPPORTED_OUTPUT_FORMATS else DEFAULT_FORMAT
+
+    def process(self, content):
+        try:
+            image = Img.open(io.BytesIO(content))
+            original_format = image.format
+            # Decided before exif_transpose, which drops the orientation tag
+            keeps_pixels = (max(image.size) <= self.max_edge and
+                            image.getexif().get(EXIF_ORIENTATION_TAG, 1) == 1)
+            # JPEGs are decoded straight at a reduced DCT scale, so the full image is never in memory
+            image.draft("RGB", (self.max_edge, self.max_edge))
+            image = ImageOps.exif_transpose(image)
+            image = self._resize(image)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            # No exif is passed to save, so the metadata is stripped from the re-encoded image
+            image.save(output, format=self.image_format, quality=self.quality, optimize=True)
+            processed = output.getvalue()
+            if keeps_pixels:
+                # Small, already compressed uploads can grow when re-encoded, then the original
+                # is sent, with its metadata removed without re-encoding
+                original = without_metadata(content, original_format)
+                if original is not None and len(original) <= len(processed):
+                    processed = original
+        except Exception as e:
+            processed = content
+        return PreprocessedImage(processed, len(content), len(processed))
+
+    def _resize(self, image):
+        longest_edge = max(image.size)
+        if longest_edge <= self.max_edge:
+            return image
+        factor = longest_edge // self.max_edge
+        if factor > 1:
+            image = image.reduce(factor)
+        image.thumbnail((self.max_edge, self.max_edge), Img.LANCZOS)
+        return image
+
+
+def without_metadata(content, image_format):
+    # The upload with its Exif and XMP metadata removed, None if that needs a re-encode
+    if image_format != "JPEG":
+        image = Img.open(io.BytesIO(content))
+        return None if image.getexif() or "exif" in image.info or "xmp" in image.info else content
+    # JPEG metadata lives in APP1 segments before the image data, they are dropped byte for byte
+    if content[:2] != b"\xff\xd8":
+        return None
+    segments = [content[:2]]
+    position = 2
+    while position + 4 <= len(content):
+        if content[position] != 0xFF:
+            return None
+        marker = content[position + 1]
+        if marker == JPEG_START_OF_SCAN:
+            segments.append(content[position:])
+            return b"".join(segments)
+        length = int.from_bytes(content[position + 2:position + 4], "big")
+        if marker != JPEG_APP1:
+            segments.append(content[position:position + 2 + length])
+        position += 2 + length
+    return None
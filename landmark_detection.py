@@ -1,7 +1,46 @@
+import os
 import pickle
+import hashlib
 import streamlit as st
 from google.cloud import vision
-from credentials import Credentials
+from cache import PersistentCache, DEFAULT_CACHE_DIR, DEFAULT_TTL_SECONDS, DEFAULT_MAX_ENTRIES
+from credentials import Credentials, get_config_value
+from resources import registry, grpc_channel_is_open
+from image_hash import NearDuplicateIndex, DEFAULT_DISTANCE_THRESHOLD, dhash
+from image_preprocessing import ImagePreprocessor, DEFAULT_MAX_EDGE, DEFAULT_QUALITY, DEFAULT_FORMAT
+
+DETECTION_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIR, "detections.sqlite")
+# Vision accepts at most 16 images per synchronous batch_annotate_images request
+MAX_IMAGES_PER_BATCH = 16
+
+
+# Raised instead of calling st.error/st.stop, the detector runs on worker threads where
+# st.stop does nothing. The caller reports it on the script thread.
+class LandmarkDetectionError(Exception):
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+@st.cache_resource(show_spinner=False)
+def get_detection_cache():
+    return PersistentCache(
+        path=get_config_value("detection_cache_path", DETECTION_CACHE_PATH),
+        table="detections",
+        ttl=float(get_config_value("detection_cache_ttl", DEFAULT_TTL_SECONDS)),
+        max_entries=int(get_config_value("detection_cache_max_entries", DEFAULT_MAX_ENTRIES)),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_near_duplicate_index():
+    # Rebuilt from the hashes stored with the cached detections, so it covers images
+    # detected by other processes and before a restart
+    index = NearDuplicateIndex(threshold=int(get_config_value("near_duplicate_threshold", DEFAULT_DISTANCE_THRESHOLD)))
+    for key, image_hash in get_detection_cache().tags():
+        index.add(int(image_hash, 16), key)
+    return index
 
 
 class GoogleCloudVision(Credentials):
@@ -9,7 +48,7 @@ class GoogleCloudVision(Credentials):
     def __init__(self):
         super().__init__()
         try:
-            self.client = vision.ImageAnnotatorClient(credentials=self.GCP_credentials)
+            registry.get("vision_client")
         except Exception as e:
             st.error(f"""
                 Error: {e}
@@ -21,44 +60,122 @@ class GoogleCloudVision(Credentials):
                 - Please try again. If the problem persists, please contact the developer.
                 """)
             st.stop()
+        self.cache = get_detection_cache()
+        self.near_duplicates = get_near_duplicate_index()
+        self.preprocessor = ImagePreprocessor(
+            max_edge=int(get_config_value("image_max_edge", DEFAULT_MAX_EDGE)),
+            quality=int(get_config_value("image_quality", DEFAULT_QUALITY)),
+            image_format=get_config_value("image_format", DEFAULT_FORMAT),
+        )
+
+    @property
+    def client(self):
+        # Looked up per request: the detector is shared by the whole process and outlives the
+        # client, which the registry rebuilds after an error or a failed health check
+        return registry.get("vision_client")
 
     def find_landmark(self, image_data):
-        image = self._load_image(image_data)
-        landmarks = self._detect_landmarks(image)
-        return landmarks
+        # The cache is keyed on the uploaded bytes, images are only preprocessed on a miss.
+        # Returns the landmarks and the preprocessing result (None on a cache hit).
+        content = self._read_upload(image_data)
+        key, image_hash, response = self._lookup_cached(content)
+        preprocessing = None
+        if response is None:
+            image, preprocessing = self._load_image(content)
+            response = self._detect_landmarks(image)
+            self._store_cached(key, image_hash, response)
+        landmarks = response.landmark_annotations
+        return landmarks, preprocessing
+
+    def find_landmarks_batch(self, images_data):
+        # Yields (index, landmarks) as soon as each image is resolved, cache hits first,
+        # the rest in batch_annotate_images calls of up to MAX_IMAGES_PER_BATCH images
+        pending = []
+        for index, image_data in enumerate(images_data):
+            content = self._read_upload(image_data)
+            key, image_hash, response = self._lookup_cached(content)
+            if response is not None:
+                yield index, response.landmark_annotations
+                continue
+            image, _ = self._load_image(content)
+            pending.append((index, image, key, image_hash))
+            if len(pending) == MAX_IMAGES_PER_BATCH:
+                yield from self._detect_landmarks_batch(pending)
+                pending = []
+        if pending:
+            yield from self._detect_landmarks_batch(pending)
+
+    def _lookup_cached(self, content):
+        key = hashlib.sha256(content).hexdigest()
+        # The cached value is the pickled API response, the same format as response.pkl
+        response = self.cache.get(key)
+        if response is not None:
+            return key, None, response
+        # Re-encoded, resized or screenshotted copies miss the exact-bytes key
+        image_hash = dhash(content)
+        if image_hash is not None:
+            for near_key in self.near_duplicates.candidates(image_hash):
+                response = self.cache.get(near_key)
+                if response is not None:
+                    break
+            self.near_duplicates.record(response is not None)
+        if response is not None:
+            self._store_cached(key, image_hash, response)
+        return key, image_hash, response
 
-    def _load_image(self, image_data):
+    def _store_cached(self, key, image_hash, response):
+        if response.error.message:
+            return
+        self.cache.set(key, response, tag=f"{image_hash:016x}" if image_hash is not None else None)
+        if image_hash is not None:
+            self.near_duplicates.add(image_hash, key)
+
+    def _read_upload(self, image_data):
         try:
             image_data.seek(0)
-            image = vision.Image(content=image_data.read())
-            return image
+            return image_data.read()
         except Exception as e:
-            st.error(f"""
-                Error: {e}
-                ### Error: Invalid image.
-                - Error Code: 0x003
-                - Please make sure you have uploaded a valid image.
-                - Please make sure the image is in one of the supported formats (png, jpg, jpeg, webp).
-                - Please try again. If the problem persists, please contact the developer.
-                """)
-            st.stop()
+            raise LandmarkDetectionError("Invalid image.", "0x003") from e
+
+    def _load_image(self, content):
+        try:
+            preprocessing = self.preprocessor.process(content)
+            image = vision.Image(content=preprocessing.content)
+            return image, preprocessing
+        except Exception as e:
+            raise LandmarkDetectionError("Invalid image.", "0x003") from e
 
     def _detect_landmarks(self, image):
         try:
             response = self.client.landmark_detection(image=image)
-            landmarks = response.landmark_annotations
-            return landmarks
+            return response
         except Exception as e:
-            st.error(f"""
-                Error: {e}
-                ### Error: Landmark detection failed.
-                - Error Code: 0x004
-                - There may be issues with Google Cloud Vision API.
-                - Another possible reason is that credentials you provided are invalid or expired.
-                - Most likely, it's not your fault.
-                - Please try again. If the problem persists, please contact the developer.
-                """)
-            st.stop()
+            registry.invalidate("vision_client")
+            raise LandmarkDetectionError("Landmark detection failed.", "0x004") from e
+
+    def _detect_landmarks_batch(self, pending):
+        try:
+            requests = [
+                vision.AnnotateImageRequest(
+                    image=image,
+                    features=[vision.Feature(type_=vision.Feature.Type.LANDMARK_DETECTION)],
+                ) for _, image, _, _ in pending
+            ]
+            batch_response = self.client.batch_annotate_images(requests=requests)
+        except Exception as e:
+            registry.invalidate("vision_client")
+            raise LandmarkDetectionError("Batch landmark detection failed.", "0x005") from e
+        for (index, _, key, image_hash), response in zip(pending, batch_response.responses):
+            self._store_cached(key, image_hash, response)
+            yield index, response.landmark_annotations
+
+
+registry.register(
+    "vision_client",
+    lambda: vision.ImageAnnotatorClient(credentials=registry.get("VertexAI_credentials")),
+    health_check=lambda client: grpc_channel_is_open(client.transport.grpc_channel),
+    depends_on=["VertexAI_credentials"],
+)
 
 
 class MockGoogleCloudVision:
@@ -69,7 +186,12 @@ class MockGoogleCloudVision:
     def find_landmark(self, image_data):
         response = self._load_mock_response()
         landmarks = response.landmark_annotations
-        return landmarks
+        return landmarks, None
+
+    def find_landmarks_batch(self, images_data):
+        response = self._load_mock_response()
+        for index, _ in enumerate(images_data):
+            yield index, response.landmark_annotations
 
     def _load_mock_response(self):
         with open("response.pkl", "rb") as f:
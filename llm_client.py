@@ -0,0 +1,107 @@
+import json
+import threading
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from credentials import get_config_value
+from resources import registry
+
+DEFAULT_BASE_URL = "https://api.together.xyz/v1"
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5
+DEFAULT_READ_TIMEOUT_SECONDS = 60
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+# Client for an OpenAI-compatible chat completions API (Together by default). One instance
+# per process keeps a pool of keep-alive connections, so requests skip the TCP and TLS
+# handshakes, and at most `max_concurrency` requests are in flight at the same time.
+class LLMClient:
+
+    def __init__(self,
+                 api_key,
+                 base_url=DEFAULT_BASE_URL,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout=DEFAULT_READ_TIMEOUT_SECONDS,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def _post(self, payload, stream=False):
+        response = self.session.post(f"{self.base_url}/chat/completions",
+                                     json=payload,
+                                     timeout=self.timeout,
+                                     stream=stream)
+        response.raise_for_status()
+        return response
+
+    def _track(self, delta, failed=False):
+        with self._lock:
+            self.in_flight += delta
+            if delta > 0:
+                self.requests += 1
+            if failed:
+                self.failures += 1
+
+    def chat(self, model, messages):
+        with self._slots:
+            self._track(1)
+            failed = True
+            try:
+                response = self._post({"model": model, "messages": messages})
+                content = response.json()["choices"][0]["message"]["content"]
+                failed = False
+                return content
+            finally:
+                self._track(-1, failed)
+
+    def stream_chat(self, model, messages):
+        # Server-sent events, one "data: {...}" line per chunk and "data: [DONE]" at the end
+        with self._slots:
+            self._track(1)
+            failed = True
+            try:
+                with self._post({"model": model, "messages": messages, "stream": True}, stream=True) as response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        choice = json.loads(data)["choices"][0]
+                        text = (choice.get("delta") or {}).get("content") or choice.get("text")
+                        if text:
+                            yield text
+                failed = False
+            finally:
+                self._track(-1, failed)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "in_flight": self.in_flight,
+            }
+
+
+def _create_llm_client():
+    return LLMClient(
+        api_key=st.secrets["TogetherAI"]["api_key"],
+        base_url=get_config_value("llm_base_url", DEFAULT_BASE_URL),
+        connect_timeout=float(get_config_value("llm_connect_timeout", DEFAULT_CONNECT_TIMEOUT_SECONDS)),
+        read_timeout=float(get_config_value("llm_read_timeout", DEFAULT_READ_TIMEOUT_SECONDS)),
+        max_concurrency=int(get_config_value("llm_max_concurrency", DEFAULT_MAX_CONCURRENCY)),
+    )
+
+
+registry.register("llm_client", _create_llm_client)
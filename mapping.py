@@ -6,6 +6,9 @@ from geopy.geocoders import Nominatim
 
 DEFAULT_ZOOM_START = 2
 ACCURACY_HEATMAP_RADIUS = 50
+WIKIPEDIA_TIMEOUT_SECONDS = 10
+CITY_KEYS = ["city", "town", "village", "suburb"]
+COUNTRY_KEYS = ["country", "state", "county"]
 
 
 class FoliumMap:
@@ -14,6 +17,7 @@ class FoliumMap:
         self.max_score_location = [0, 0]
         self.max_score = 0
         self.zoom_start = zoom_start_
+        self.satellite_layer = None
         self.map = self._create_initial_map()
         try:
             self.geo_locator = Nominatim(user_agent="LandMarker_App")
@@ -40,27 +44,31 @@ class FoliumMap:
                 """)
             st.stop()
 
+    @staticmethod
+    def find_wikipedia_page(landmark):
+        # Raises on failure instead of reporting it, for callers off the script thread
+        response = requests.get(
+            "https://en.wikipedia.org/w/api.php",
+            params={
+                "action": "query",
+                "format": "json",
+                "list": "search",
+                "srsearch": landmark,
+            },
+            timeout=WIKIPEDIA_TIMEOUT_SECONDS,
+        ).json()
+        if response["query"]["search"]:
+            page_title = response["query"]["search"][0]["title"]
+            return f"https://www.wikipedia.org/wiki/{page_title.replace(' ', '_')}"
+        return None
+
     @staticmethod
     def get_wikipedia_page(landmark):
         tries = 0
         try:
-            response = requests.get(
-                "https://en.wikipedia.org/w/api.php",
-                params={
-                    "action": "query",
-                    "format": "json",
-                    "list": "search",
-                    "srsearch": landmark,
-                },
-            ).json()
-            if response["query"]["search"]:
-                page_title = response["query"]["search"][0]["title"]
-                page_url = (f"https://www.wikipedia.org/wiki/{page_title.replace(' ', '_')}")
-                tries = 0
-                return page_url
-            else:
-                tries = 0
-                return None
+            page_url = FoliumMap.find_wikipedia_page(landmark)
+            tries = 0
+            return page_url
         except Exception as e:
             tries += 1
             if tries > 2:
@@ -104,10 +112,15 @@ class FoliumMap:
             else:
                 st.rerun()
         address = location.raw["address"]
-        city_keys = ["city", "town", "village", "suburb"]
-        country_keys = ["country", "state", "county"]
-        city = self._get_detail_from_address(address, city_keys)
-        country = self._get_detail_from_address(address, country_keys)
+        city = self._get_detail_from_address(address, CITY_KEYS)
+        country = self._get_detail_from_address(address, COUNTRY_KEYS)
+        return city, country
+
+    def find_city_country(self, lat, lon):
+        # Raises on failure instead of reporting it, for callers off the script thread
+        address = self.geo_locator.reverse(f"{lat}, {lon}").raw["address"]
+        city = next((address[key] for key in CITY_KEYS if key in address), "")
+        country = next((address[key] for key in COUNTRY_KEYS if key in address), "")
         return city, country
 
     def _get_detail_from_address(self, address, keys):
@@ -216,6 +229,14 @@ class FoliumMap:
             else:
                 st.rerun()
 
+    def set_satellite_mode(self, enabled):
+        # Only the tile layer is added or dropped, markers and bounds stay as they are
+        if enabled and self.satellite_layer is None:
+            self.satellite_layer = self.satellite_map()
+        elif not enabled and self.satellite_layer is not None:
+            self.map._children.pop(self.satellite_layer.get_name(), None)
+            self.satellite_layer = None
+
     def get_city_country(self, lat, lon):
         city, country = self.get_location_details(lat, lon)
         return city, country
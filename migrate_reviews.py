@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import argparse
+from cache import DEFAULT_CACHE_DIR
+from resources import registry
+from review_schema import review_coordinates, coordinate_fields, needs_migration
+from firestore import MAX_BATCH_WRITES, rebuild_landmark_name_index, rebuild_landmark_stats
+
+MAX_BATCH_SIZE = MAX_BATCH_WRITES
+DEFAULT_CHECKPOINT_PATH = os.path.join(DEFAULT_CACHE_DIR, "migrate_reviews.json")
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {"last_document_id": None, "scanned": 0, "migrated": 0, "skipped": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def migrate(client, batch_size, checkpoint_path, dry_run=False, limit=None):
+    reviews_ref = client.collection("user_reviews")
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint["last_document_id"]:
+        print(f"Resuming after document {checkpoint['last_document_id']} ({checkpoint['scanned']} already scanned).")
+    start = time.monotonic()
+    scanned = 0
+    while limit is None or scanned < limit:
+        query = reviews_ref.order_by("__name__").limit(batch_size)
+        if checkpoint["last_document_id"]:
+            query = query.start_after(reviews_ref.document(checkpoint["last_document_id"]).get())
+        snapshots = list(query.stream())
+        if not snapshots:
+            break
+        batch = client.batch()
+        writes = 0
+        for snapshot in snapshots:
+            review_data = snapshot.to_dict()
+            if not needs_migration(review_data):
+                continue
+            try:
+                longitude, latitude = review_coordinates(review_data)
+            except Exception as e:
+                print(f"Skipping {snapshot.id}: unreadable coordinates {review_data.get('Coordinates')!r}")
+                checkpoint["skipped"] += 1
+                continue
+            fields = coordinate_fields(longitude, latitude)
+            if "CreatedAt" not in review_data:
+                # Reviews from before CreatedAt existed are dated by their document, so queries
+                # ordered by CreatedAt, which skip documents without it, still return them
+                fields["CreatedAt"] = snapshot.create_time
+            if "WrittenAt" not in review_data:
+                fields["WrittenAt"] = snapshot.create_time
+            batch.update(snapshot.reference, fields)
+            writes += 1
+        if writes and not dry_run:
+            batch.commit()
+        scanned += len(snapshots)
+        checkpoint["last_document_id"] = snapshots[-1].id
+        checkpoint["scanned"] += len(snapshots)
+        checkpoint["migrated"] += writes
+        if not dry_run:
+            save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.monotonic() - start
+        print(f"Scanned {checkpoint['scanned']}, migrated {checkpoint['migrated']}, "
+              f"skipped {checkpoint['skipped']} ({scanned / elapsed:.0f} docs/s)")
+        if len(snapshots) < batch_size:
+            break
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add GeoPoint, numeric coordinates, geohashes, CreatedAt and WrittenAt to existing user_reviews documents.")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE, help="Documents per batched write (max 500).")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="File used to resume an interrupted run.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning.")
+    parser.add_argument("--limit", type=int, help="Stop after scanning this many documents.")
+    parser.add_argument("--dry-run", action="store_true", help="Scan and report without writing anything.")
+    parser.add_argument("--skip-name-index",
+                        action="store_true",
+                        help="Do not rebuild the landmark name index after the migration.")
+    parser.add_argument("--skip-stats",
+                        action="store_true",
+                        help="Do not recount the landmark statistics after the migration.")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    batch_size = min(max(args.batch_size, 1), MAX_BATCH_SIZE)
+    checkpoint = migrate(registry.get("firestore_client"), batch_size, args.checkpoint, args.dry_run, args.limit)
+    print(f"Done: {checkpoint['scanned']} scanned, {checkpoint['migrated']} migrated, {checkpoint['skipped']} skipped.")
+    if not (args.dry_run or args.skip_name_index):
+        # Fuzzy name matching only finds reviews whose landmark name is in the index
+        count = rebuild_landmark_name_index(registry.get("firestore_client"))
+        print(f"Indexed {count} landmark names.")
+    if not (args.dry_run or args.skip_stats):
+        # Statistics are shown only for landmarks whose aggregates were recounted from all reviews
+        count = rebuild_landmark_stats(registry.get("firestore_client"))
+        print(f"Recounted statistics of {count} landmarks.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+SUMMARY = ("The Maiden Tower is a 12th-century monument in the Old City, Baku, Azerbaijan. Along with the "
+           "Shirvanshahs' Palace, dated to the 15th century, it forms a group of historic monuments listed in 2001 "
+           "under the UNESCO World Heritage List of historical monuments as cultural property, Category III.")
+
+
+# Local stand-in for an OpenAI-compatible chat completions API, for load tests and
+# development without an API key. Point the app at it with llm_base_url.
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    token_interval = 0.0
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self.send_error(404)
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        if payload.get("stream"):
+            self._stream(payload)
+            return
+        body = json.dumps({
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": SUMMARY
+                },
+                "finish_reason": "stop",
+            }],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, payload):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in SUMMARY.split(" "):
+            chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(self.token_interval)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve canned chat completions on an OpenAI-compatible API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the response starts.")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Seconds between streamed tokens.")
+    args = parser.parse_args()
+
+    ChatCompletionsHandler.latency = args.latency
+    ChatCompletionsHandler.token_interval = args.token_interval
+    server = ThreadingHTTPServer((args.host, args.port), ChatCompletionsHandler)
+    print(f"Serving chat completions on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import time
+import threading
+
+HEALTH_CHECK_INTERVAL_SECONDS = 30
+GRPC_CHANNEL_SHUTDOWN = 4
+
+
+def grpc_channel_is_open(channel):
+    try:
+        return channel._channel.check_connectivity_state(False) != GRPC_CHANNEL_SHUTDOWN
+    except Exception as e:
+        # Not a channel we know how to inspect, let the client reconnect on its own
+        return True
+
+
+# Process-wide registry of credentials and API clients. Streamlit re-runs only the main
+# script, imported modules stay in sys.modules, so everything here outlives reruns and
+# is shared across sessions. Resources are built lazily on first use and rebuilt when
+# their health check fails, a dependency was rebuilt, or they were invalidated after an error.
+# A resource registered with `close` is closed when it is replaced or invalidated.
+class ResourceRegistry:
+
+    def __init__(self, health_check_interval=HEALTH_CHECK_INTERVAL_SECONDS):
+        self.health_check_interval = health_check_interval
+        self._specs = {}
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, health_check=None, depends_on=(), close=None):
+        with self._lock:
+            if name not in self._specs:
+                self._specs[name] = (factory, health_check, tuple(depends_on), close)
+
+    def get(self, name):
+        with self._lock:
+            factory, health_check, depends_on, _ = self._specs[name]
+            dependencies = {dependency: self._generation_of(dependency) for dependency in depends_on}
+            entry = self._entries.get(name)
+            if entry is not None and self._is_usable(entry, health_check, dependencies):
+                return entry["value"]
+            self._discard(name)
+            value = factory()
+            if value is None:
+                return None
+            self._entries[name] = {
+                "value": value,
+                "dependencies": dependencies,
+                "checked_at": time.monotonic(),
+            }
+            self._generations[name] = self._generations.get(name, 0) + 1
+            return value
+
+    def _generation_of(self, name):
+        self.get(name)
+        return self._generations.get(name, 0)
+
+    def _is_usable(self, entry, health_check, dependencies):
+        if entry["dependencies"] != dependencies:
+            return False
+        if health_check is None or time.monotonic() - entry["checked_at"] < self.health_check_interval:
+            return True
+        entry["checked_at"] = time.monotonic()
+        try:
+            return bool(health_check(entry["value"]))
+        except Exception as e:
+            return False
+
+    def _discard(self, name):
+        entry = self._entries.pop(name, None)
+        close = self._specs[name][3]
+        if entry is None or close is None:
+            return
+        try:
+            close(entry["value"])
+        except Exception as e:
+            pass
+
+    def invalidate(self, name):
+        with self._lock:
+            self._discard(name)
+
+    def status(self):
+        with self._lock:
+            return {name: name in self._entries for name in self._specs}
+
+
+registry = ResourceRegistry()
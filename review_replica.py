@@ -0,0 +1,161 @@
+import sys
+import time
+import threading
+import numpy as np
+from trigram_index import TrigramIndex
+from review_schema import review_coordinates
+
+INITIAL_CAPACITY = 1024
+INITIAL_LOAD_TIMEOUT_SECONDS = 30
+
+
+# Process-wide replica of user_reviews. The first snapshot loads every document, after that
+# only the changed documents are applied. Coordinates, scores and interned landmark names are
+# kept in NumPy columns so queries are vectorised scans instead of Firestore reads. In
+# bounded-memory mode the review documents themselves are not kept, matches are fetched by id.
+class ReviewReplica:
+
+    def __init__(self, client, collection="user_reviews", bounded_memory=False):
+        self.client = client
+        self.collection_ref = client.collection(collection)
+        self.bounded_memory = bounded_memory
+        self.longitudes = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.latitudes = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.scores = np.zeros(INITIAL_CAPACITY, dtype=np.int16)
+        self.name_ids = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.doc_ids = [None] * INITIAL_CAPACITY
+        self.rows = {}
+        self.free_rows = []
+        self.size = 0
+        self.names = []
+        self.name_lookup = {}
+        self.name_index = TrigramIndex()
+        self.documents = {}
+        self.changes_applied = 0
+        self.last_sync = None
+        self.read_time = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._watch = self.collection_ref.on_snapshot(self._on_snapshot)
+
+    def wait_until_ready(self, timeout=INITIAL_LOAD_TIMEOUT_SECONDS):
+        return self.ready.wait(timeout)
+
+    @property
+    def is_ready(self):
+        return self.ready.is_set()
+
+    @property
+    def is_active(self):
+        return self._watch is not None and getattr(self._watch, "is_active", True)
+
+    def close(self):
+        # Stops the listener, a replaced replica must not keep streaming changes
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, snapshots, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self._remove(change.document.id)
+                else:
+                    self._upsert(change.document.id, change.document.to_dict())
+            self.changes_applied += len(changes)
+            self.last_sync = time.time()
+            self.read_time = read_time
+        self.ready.set()
+
+    def _upsert(self, doc_id, review_data):
+        try:
+            longitude, latitude = review_coordinates(review_data)
+        except Exception as e:
+            self._remove(doc_id)
+            return
+        row = self.rows.get(doc_id)
+        if row is None:
+            row = self.free_rows.pop() if self.free_rows else self._next_row()
+            self.rows[doc_id] = row
+            self.doc_ids[row] = doc_id
+        self.longitudes[row] = longitude
+        self.latitudes[row] = latitude
+        self.scores[row] = review_data.get("Score10", 0)
+        self.name_ids[row] = self._intern(review_data.get("Landmark", ""))
+        self.alive[row] = True
+        if not self.bounded_memory:
+            self.documents[doc_id] = review_data
+
+    def _remove(self, doc_id):
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.doc_ids[row] = None
+        self.free_rows.append(row)
+        self.documents.pop(doc_id, None)
+
+    def _next_row(self):
+        if self.size == len(self.alive):
+            self._grow()
+        self.size += 1
+        return self.size - 1
+
+    def _grow(self):
+        capacity = 2 * len(self.alive)
+        for column in ("longitudes", "latitudes", "scores", "name_ids", "alive"):
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+        self.doc_ids.extend([None] * (capacity - len(self.doc_ids)))
+
+    def _intern(self, name):
+        name_id = self.name_lookup.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_lookup[name] = name_id
+            self.name_index.add(name)
+        return name_id
+
+    def all_reviews(self):
+        with self._lock:
+            doc_ids = [doc_id for doc_id in self.doc_ids[:self.size] if doc_id is not None]
+        return self._documents_for(doc_ids)
+
+    def reviews_for_landmark(self, long, lat, accuracy_range, landmark_name):
+        with self._lock:
+            n = self.size
+            mask = (self.alive[:n] & (np.abs(self.longitudes[:n] - long) <= accuracy_range) &
+                    (np.abs(self.latitudes[:n] - lat) <= accuracy_range))
+            matched_ids = [self.name_lookup[name] for name in self.name_index.matches(landmark_name)]
+            if matched_ids:
+                mask |= self.alive[:n] & np.isin(self.name_ids[:n], matched_ids)
+            doc_ids = [self.doc_ids[row] for row in np.flatnonzero(mask)]
+        return self._documents_for(doc_ids)
+
+    def _documents_for(self, doc_ids):
+        if not self.bounded_memory:
+            with self._lock:
+                return [self.documents[doc_id] for doc_id in doc_ids if doc_id in self.documents]
+        refs = [self.collection_ref.document(doc_id) for doc_id in doc_ids]
+        return [snapshot.to_dict() for snapshot in self.client.get_all(refs) if snapshot.exists]
+
+    def metrics(self):
+        with self._lock:
+            column_bytes = sum(
+                getattr(self, column).nbytes for column in ("longitudes", "latitudes", "scores", "name_ids", "alive"))
+            name_bytes = sum(sys.getsizeof(name) for name in self.names)
+            document_bytes = sum(
+                sum(sys.getsizeof(value) for value in review_data.values()) for review_data in self.documents.values())
+            return {
+                "documents": len(self.rows),
+                "distinct_landmarks": len(self.names),
+                "changes_applied": self.changes_applied,
+                "staleness_seconds": time.time() - self.last_sync if self.last_sync else None,
+                "listening": self.is_active,
+                "bounded_memory": self.bounded_memory,
+                "memory_bytes": column_bytes + name_bytes + document_bytes,
+            }
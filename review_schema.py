@@ -0,0 +1,29 @@
+import geohash
+
+COORDINATE_FIELDS = ("Location", "Longitude", "Latitude", "Geohash", "GeohashPrefixes")
+
+
+def review_coordinates(review_data):
+    # Accepts both the numeric fields and the legacy "lon/lat" Coordinates string
+    if "Longitude" in review_data and "Latitude" in review_data:
+        return float(review_data["Longitude"]), float(review_data["Latitude"])
+    longitude, latitude = review_data["Coordinates"].split("/")
+    return float(longitude), float(latitude)
+
+
+def coordinate_fields(longitude, latitude):
+    # Imported here so the SQLite backend can share this module without the Firestore SDK
+    from google.cloud.firestore import GeoPoint
+    return {
+        "Location": GeoPoint(latitude, longitude),
+        "Longitude": longitude,
+        "Latitude": latitude,
+        "Geohash": geohash.encode(latitude, longitude),
+        # Every prefix, including "", so covering cells can be matched with array-contains-any
+        # in queries that are ordered by another field
+        "GeohashPrefixes": geohash.prefixes(geohash.encode(latitude, longitude)),
+    }
+
+
+def needs_migration(review_data):
+    return any(field not in review_data for field in COORDINATE_FIELDS + ("CreatedAt", "WrittenAt"))
@@ -0,0 +1,93 @@
+import re
+import zlib
+import hashlib
+import numpy as np
+
+DEFAULT_TOKEN_BUDGET = 1500
+# Trade-off between relevance to the stratum and novelty w.r.t. the reviews already picked
+DEFAULT_MMR_LAMBDA = 0.7
+# Width of the hashed TF-IDF vectors, collisions between rare words barely affect the similarities
+HASHED_FEATURES = 1024
+# Same bands as the star rating shown next to each review
+SCORE_BANDS = ((1, 2), (3, 4), (5, 6), (7, 8), (9, 10))
+
+
+def estimate_tokens(text):
+    # Rough estimate for English text, about four characters per token
+    return len(text) // 4 + 1
+
+
+def review_id(review):
+    # Reviews are plain dicts without their document id, so they are identified by content
+    content = "\x1f".join(str(review.get(field, "")) for field in ("Username", "Landmark", "Review"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+
+def _tokenize(text):
+    return re.findall(r"\w+", text.casefold())
+
+
+def tfidf_vectors(texts, features=HASHED_FEATURES):
+    # Tokens are hashed into a fixed number of columns, so memory grows with the number of
+    # reviews only. crc32 rather than hash(), which is salted per process, keeps the
+    # selection the same across restarts.
+    documents = [_tokenize(text) for text in texts]
+    counts = np.zeros((len(documents), features), dtype=np.float32)
+    for row, tokens in enumerate(documents):
+        columns = [zlib.crc32(token.encode("utf-8")) % features for token in tokens]
+        np.add.at(counts[row], columns, 1)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    vectors = np.log1p(counts) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _score_band(review):
+    score = review.get("Score10") or 0
+    for band, (low, high) in enumerate(SCORE_BANDS):
+        if low <= score <= high:
+            return band
+    return 0 if score < SCORE_BANDS[0][0] else len(SCORE_BANDS) - 1
+
+
+def select_representative(reviews, token_budget=DEFAULT_TOKEN_BUDGET, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    # Greedy max-marginal-relevance over TF-IDF vectors. Reviews are grouped by score band and
+    # each step serves the band furthest below its share of the selection, so the subset keeps
+    # the score distribution of all reviews. Returns the chosen reviews in their original order.
+    tokens = [estimate_tokens(review["Review"]) for review in reviews]
+    if sum(tokens) <= token_budget:
+        return list(reviews)
+    vectors = tfidf_vectors([review["Review"] for review in reviews])
+    strata = {}
+    for index, review in enumerate(reviews):
+        strata.setdefault(_score_band(review), []).append(index)
+    relevance = np.zeros(len(reviews), dtype=np.float32)
+    for indices in strata.values():
+        centroid = vectors[indices].mean(axis=0)
+        relevance[indices] = vectors[indices] @ centroid / (np.linalg.norm(centroid) or 1)
+    # Highest similarity of every review to the selection so far
+    redundancy = np.zeros(len(reviews), dtype=np.float32)
+    selected = []
+    picked = {band: 0 for band in strata}
+    remaining = {band: list(indices) for band, indices in strata.items()}
+    budget = token_budget
+    while any(remaining.values()):
+        band = min((band for band in remaining if remaining[band]),
+                   key=lambda band: (picked[band] / len(strata[band]), -len(strata[band])))
+        candidates = [index for index in remaining[band] if tokens[index] <= budget]
+        if not candidates:
+            remaining[band] = []
+            continue
+        scores = mmr_lambda * relevance[candidates] - (1 - mmr_lambda) * redundancy[candidates]
+        best = candidates[int(np.argmax(scores))]
+        remaining[band].remove(best)
+        picked[band] += 1
+        selected.append(best)
+        budget -= tokens[best]
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return [reviews[index] for index in sorted(selected)]
+
+
+def selection_ids(reviews):
+    return sorted(review_id(review) for review in reviews)
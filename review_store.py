@@ -0,0 +1,57 @@
+from abc import ABC, abstractmethod
+import streamlit as st
+from credentials import get_config_value
+
+DEFAULT_REVIEW_BACKEND = "firestore"
+# Reviews within this many degrees of a landmark belong to it, even under another name
+REVIEW_ACCURACY_RANGE = 0.1
+# Review summaries are built from at most this many reviews, the review list is loaded page by page
+SUMMARY_MAX_REVIEWS = 200
+
+
+# Methods every review storage backend provides. Reviews are returned as dicts with the
+# Firestore field names (Username, Landmark, Coordinates, Score10, Review, ...).
+class ReviewStore(ABC):
+
+    @abstractmethod
+    def get_all_reviews(self):
+        ...
+
+    @abstractmethod
+    def create_new_review(self, review, landmark, coordinates, score, username):
+        ...
+
+    @abstractmethod
+    def get_review_for_landmark(self, long, lat, accuracy_range, landmark_name, limit=None):
+        ...
+
+    @abstractmethod
+    def find_reviews_for_landmark(self, long, lat, accuracy_range, landmark_name, limit=None):
+        # Same as get_review_for_landmark, but raises instead of reporting errors with st.error
+        ...
+
+    @abstractmethod
+    def get_reviews_page(self, long, lat, accuracy_range, landmark_name, cursor=None, page_size=10, order_by="Score10"):
+        # Reviews in the box or under a matching name, the same set as find_reviews_for_landmark
+        ...
+
+    @abstractmethod
+    def get_landmark_stats(self, landmark_name):
+        ...
+
+
+def reviews_for_summary(store, long, lat, landmark_name):
+    # The app and warm_summaries.py must summarize the same reviews, or the warmed chunks are never hit
+    return store.find_reviews_for_landmark(long, lat, REVIEW_ACCURACY_RANGE, landmark_name, SUMMARY_MAX_REVIEWS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_review_store():
+    # One store per process, shared by all sessions. Backends are imported on demand,
+    # the SQLite one does not need the Firestore SDK
+    backend = get_config_value("review_backend", DEFAULT_REVIEW_BACKEND).lower()
+    if backend == "sqlite":
+        from sqlite_store import SQLiteReviewStore, DEFAULT_DATABASE_PATH
+        return SQLiteReviewStore(get_config_value("review_sqlite_path", DEFAULT_DATABASE_PATH))
+    from firestore import Firestore
+    return Firestore()
@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import Future
+
+
+class _Stream:
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+
+# Coalesces concurrent identical calls within the process. While a call for a key is in
+# flight, later callers with the same key wait for it and get its result (or its
+# exception) instead of starting their own. Nothing is kept once the call finishes,
+# caching the result is left to the caller.
+class SingleFlight:
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+        if leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+        return future.result()
+
+    def stream(self, key, start):
+        # `start()` returns an iterator of chunks. It is drained once by a background thread,
+        # every listener replays the chunks from the beginning and then follows along live.
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = _Stream()
+                self._streams[key] = flight
+                self.calls += 1
+                threading.Thread(target=self._produce, args=(key, flight, start), name="singleflight-stream",
+                                 daemon=True).start()
+            else:
+                self.shared += 1
+        return self._listen(flight)
+
+    def _produce(self, key, flight, start):
+        try:
+            for chunk in start():
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._streams.pop(key, None)
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    def _listen(self, flight):
+        position = 0
+        while True:
+            with flight.condition:
+                while position == len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                chunks = flight.chunks[position:]
+                position += len(chunks)
+                done = flight.done and position == len(flight.chunks)
+            yield from chunks
+            if done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._streams),
+            }
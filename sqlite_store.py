@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+import streamlit as st
+from fuzzywuzzy import fuzz
+from cache import DEFAULT_CACHE_DIR
+from review_store import ReviewStore
+from review_schema import review_coordinates
+from trigram_index import DEFAULT_MIN_SIMILARITY, trigrams
+
+DEFAULT_DATABASE_PATH = os.path.join(DEFAULT_CACHE_DIR, "reviews.sqlite")
+REVIEWS_PAGE_SIZE = 10
+ORDER_BY_COLUMNS = {"Score10": "score", "CreatedAt": "created_at"}
+
+
+# Local review storage for self-hosted deployments and load tests. Coordinates are indexed
+# with an R-tree, distinct landmark names with an FTS5 trigram index for fuzzy matching.
+class SQLiteReviewStore(ReviewStore):
+
+    def __init__(self, path=DEFAULT_DATABASE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with self._connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS reviews (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        username TEXT NOT NULL,
+                        landmark TEXT NOT NULL,
+                        coordinates TEXT NOT NULL,
+                        longitude REAL NOT NULL,
+                        latitude REAL NOT NULL,
+                        score INTEGER NOT NULL,
+                        review TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS reviews_landmark ON reviews (landmark, score);
+                    CREATE VIRTUAL TABLE IF NOT EXISTS reviews_rtree USING rtree (
+                        id, min_longitude, max_longitude, min_latitude, max_latitude
+                    );
+                    CREATE VIRTUAL TABLE IF NOT EXISTS landmark_names USING fts5 (name, tokenize = "trigram");
+                    CREATE TABLE IF NOT EXISTS landmark_stats (
+                        landmark TEXT PRIMARY KEY,
+                        count INTEGER NOT NULL,
+                        score_sum INTEGER NOT NULL,
+                        histogram TEXT NOT NULL,
+                        last_updated REAL NOT NULL
+                    );
+                    """)
+        except Exception as e:
+            st.error(f"""
+                ### Error: Review database could not be opened.
+                - Error Code: 6x000
+                - There may be issues with the local review database.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            st.stop()
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads, each thread keeps its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def get_all_reviews(self):
+        try:
+            rows = self._connection().execute("SELECT * FROM reviews ORDER BY id").fetchall()
+            return [_review_from_row(row) for row in rows]
+        except Exception as e:
+            st.error(f"""
+                ### Error: Failed to retrieve reviews.
+                - Error Code: 6x001
+                - There may be issues with the local review database.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return None
+
+    def create_new_review(self, review, landmark, coordinates, score, username):
+        try:
+            longitude, latitude = review_coordinates({"Coordinates": coordinates})
+            now = time.time()
+            with self._connection() as conn:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO reviews (username, landmark, coordinates, longitude, latitude, score, review, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (username, landmark, coordinates, longitude, latitude, score, review, now),
+                )
+                conn.execute(
+                    "INSERT INTO reviews_rtree VALUES (?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, longitude, longitude, latitude, latitude),
+                )
+                if conn.execute("SELECT 1 FROM landmark_names WHERE name = ?", (landmark,)).fetchone() is None:
+                    conn.execute("INSERT INTO landmark_names (name) VALUES (?)", (landmark,))
+                row = conn.execute("SELECT histogram FROM landmark_stats WHERE landmark = ?", (landmark,)).fetchone()
+                histogram = json.loads(row["histogram"]) if row else {}
+                histogram[str(score)] = histogram.get(str(score), 0) + 1
+                conn.execute(
+                    """
+                    INSERT INTO landmark_stats (landmark, count, score_sum, histogram, last_updated)
+                    VALUES (?, 1, ?, ?, ?)
+                    ON CONFLICT (landmark) DO UPDATE SET
+                        count = count + 1, score_sum = score_sum + excluded.score_sum,
+                        histogram = excluded.histogram, last_updated = excluded.last_updated
+                    """,
+                    (landmark, score, json.dumps(histogram), now),
+                )
+        except Exception as e:
+            st.error(f"""
+                ### Error: Failed to save new review.
+                - Error Code: 6x002
+                - There may be issues with the local review database.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+
+    def _matching_names(self, landmark_name):
+        grams = [gram for gram in trigrams(landmark_name) if gram.strip() == gram]
+        if not grams:
+            return [landmark_name]
+        query = " OR ".join('"' + gram.replace('"', '""') + '"' for gram in grams)
+        rows = self._connection().execute("SELECT name FROM landmark_names WHERE landmark_names MATCH ?",
+                                          (query,)).fetchall()
+        names = [row["name"] for row in rows if fuzz.ratio(row["name"], landmark_name) >= DEFAULT_MIN_SIMILARITY]
+        return names or [landmark_name]
+
+    def get_review_for_landmark(self, long, lat, accuracy_range, landmark_name, limit=None):
+        try:
+            return self.find_reviews_for_landmark(long, lat, accuracy_range, landmark_name, limit)
+        except Exception as e:
+            st.error(f"""
+                ### Error: Failed to retrieve reviews for landmark.
+                - Error Code: 6x003
+                - There may be issues with the local review database.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return None
+
+    def _matching_reviews(self, long, lat, accuracy_range, landmark_name):
+        # Reviews inside the box or under one of the fuzzy-matched names, as a WHERE clause and its parameters
+        names = self._matching_names(landmark_name)
+        clause = f"""
+            (landmark IN ({', '.join('?' * len(names))}) OR id IN (
+                SELECT id FROM reviews_rtree
+                WHERE max_longitude >= ? AND min_longitude <= ? AND max_latitude >= ? AND min_latitude <= ?
+            ))
+            """
+        return clause, list(names) + [long - accuracy_range, long + accuracy_range, lat - accuracy_range,
+                                      lat + accuracy_range]
+
+    def find_reviews_for_landmark(self, long, lat, accuracy_range, landmark_name, limit=None):
+        clause, params = self._matching_reviews(long, lat, accuracy_range, landmark_name)
+        query = f"SELECT * FROM reviews WHERE {clause}"
+        if limit is not None:
+            # The newest reviews, like the Firestore backend
+            query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+            params.append(limit)
+        rows = self._connection().execute(query, params).fetchall()
+        reviews = {row["id"]: _review_from_row(row) for row in rows}
+        if reviews:
+            return list(reviews.values())
+        return None
+
+    def get_reviews_page(self,
+                         long,
+                         lat,
+                         accuracy_range,
+                         landmark_name,
+                         cursor=None,
+                         page_size=REVIEWS_PAGE_SIZE,
+                         order_by="Score10"):
+        # The cursor is the (order value, id) pair of the last review on the previous page
+        try:
+            column = ORDER_BY_COLUMNS[order_by]
+            clause, params = self._matching_reviews(long, lat, accuracy_range, landmark_name)
+            query = f"SELECT * FROM reviews WHERE {clause}"
+            if cursor is not None:
+                query += f" AND ({column} < ? OR ({column} = ? AND id < ?))"
+                params += [cursor[0], cursor[0], cursor[1]]
+            query += f" ORDER BY {column} DESC, id DESC LIMIT ?"
+            rows = self._connection().execute(query, params + [page_size]).fetchall()
+            next_cursor = (rows[-1][column], rows[-1]["id"]) if len(rows) == page_size else None
+            return [_review_from_row(row) for row in rows], next_cursor
+        except Exception as e:
+            st.error(f"""
+                ### Error: Failed to retrieve reviews for landmark.
+                - Error Code: 6x004
+                - There may be issues with the local review database.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return [], None
+
+    def get_landmark_stats(self, landmark_name):
+        try:
+            names = self._matching_names(landmark_name)
+            rows = self._connection().execute(
+                f"SELECT * FROM landmark_stats WHERE landmark IN ({', '.join('?' * len(names))})",
+                names,
+            ).fetchall()
+            stats = {"Count": 0, "ScoreSum": 0, "Histogram": {}, "LastUpdated": None, "Landmarks": []}
+            for row in rows:
+                stats["Landmarks"].append(row["landmark"])
+                stats["Count"] += row["count"]
+                stats["ScoreSum"] += row["score_sum"]
+                for score, count in json.loads(row["histogram"]).items():
+                    stats["Histogram"][score] = stats["Histogram"].get(score, 0) + count
+                stats["LastUpdated"] = max(stats["LastUpdated"] or 0, row["last_updated"])
+            if stats["Count"]:
+                return stats
+            return None
+        except Exception as e:
+            st.error(f"""
+                ### Error: Failed to retrieve review statistics for landmark.
+                - Error Code: 6x005
+                - There may be issues with the local review database.
+                - Please try again. If the problem persists, please contact the developer.
+                """)
+            return None
+
+
+def _review_from_row(row):
+    return {
+        "Username": row["username"],
+        "Landmark": row["landmark"],
+        "Coordinates": row["coordinates"],
+        "Longitude": row["longitude"],
+        "Latitude": row["latitude"],
+        "Score10": row["score"],
+        "Review": row["review"],
+        "CreatedAt": datetime.fromtimestamp(row["created_at"], tz=timezone.utc),
+    }
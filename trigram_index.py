@@ -0,0 +1,50 @@
+import math
+import time
+import threading
+from collections import Counter, defaultdict
+from fuzzywuzzy import fuzz
+
+NGRAM_SIZE = 3
+DEFAULT_MIN_SIMILARITY = 80
+# Share of the query's trigrams a name must contain before the exact ratio is computed
+MIN_TRIGRAM_OVERLAP = 0.2
+
+
+def trigrams(name):
+    padded = f" {' '.join(name.lower().split())} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+class TrigramIndex:
+
+    def __init__(self, names=()):
+        self.names = set()
+        self.postings = defaultdict(set)
+        self.created_at = time.monotonic()
+        self._lock = threading.Lock()
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        with self._lock:
+            if name in self.names:
+                return False
+            self.names.add(name)
+            for gram in trigrams(name):
+                self.postings[gram].add(name)
+            return True
+
+    def candidates(self, query):
+        grams = trigrams(query)
+        counts = Counter()
+        with self._lock:
+            for gram in grams:
+                counts.update(self.postings.get(gram, ()))
+        min_shared = max(1, math.ceil(len(grams) * MIN_TRIGRAM_OVERLAP))
+        return [name for name, shared in counts.items() if shared >= min_shared]
+
+    def matches(self, query, min_similarity=DEFAULT_MIN_SIMILARITY):
+        return [name for name in self.candidates(query) if fuzz.ratio(name, query) >= min_similarity]
+
+    def __len__(self):
+        return len(self.names)
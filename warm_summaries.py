@@ -0,0 +1,160 @@
+import os
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache import DEFAULT_CACHE_DIR
+from review_schema import review_coordinates
+from review_store import reviews_for_summary
+
+DEFAULT_TOP_LANDMARKS = 100
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_PER_SECOND = 1.0
+DEFAULT_CHECKPOINT_PATH = os.path.join(DEFAULT_CACHE_DIR, "warm_summaries.json")
+
+
+class RateLimiter:
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(start - now, 0))
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"done": [], "failed": {}}
+
+
+def save_checkpoint(path, checkpoint):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def landmarks_from_reviews(store, top):
+    # The most reviewed landmarks, located by the coordinates of one of their reviews
+    landmarks = {}
+    for review in store.get_all_reviews() or []:
+        entry = landmarks.setdefault(review["Landmark"], {"landmark": review["Landmark"], "count": 0})
+        entry["count"] += 1
+        if "longitude" not in entry:
+            try:
+                entry["longitude"], entry["latitude"] = review_coordinates(review)
+            except Exception as e:
+                pass
+    ranked = sorted(landmarks.values(), key=lambda entry: entry["count"], reverse=True)
+    return ranked[:top]
+
+
+def landmarks_from_csv(path):
+    # Columns: landmark, and optionally city, country, latitude, longitude
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    landmarks = []
+    for row in rows:
+        entry = {"landmark": row["landmark"].strip(), "city": row.get("city"), "country": row.get("country")}
+        if row.get("latitude") and row.get("longitude"):
+            entry["latitude"], entry["longitude"] = float(row["latitude"]), float(row["longitude"])
+        landmarks.append(entry)
+    return landmarks
+
+
+def warm_landmark(entry, summarizer, store, locate, limiter, with_reviews):
+    landmark = entry["landmark"]
+    city, country = entry.get("city"), entry.get("country")
+    if not (city and country):
+        if "latitude" not in entry:
+            raise ValueError("no city/country and no coordinates to look them up")
+        city, country = locate(entry["latitude"], entry["longitude"])
+        if not (city and country):
+            raise ValueError("location could not be resolved")
+    limiter.wait()
+    if not summarizer.landmark_summary(landmark, city, country):
+        raise RuntimeError("landmark summary could not be generated")
+    if with_reviews and "latitude" in entry:
+        # The same reviews the app summarizes, so the warmed chunk and reduce entries are hit
+        reviews = reviews_for_summary(store, entry["longitude"], entry["latitude"], landmark)
+        if reviews:
+            limiter.wait()
+            if not summarizer.review_summary(landmark, city, country, reviews):
+                raise RuntimeError("review summary could not be generated")
+
+
+def warm(args):
+    from ai_summary import AI_Summary
+    from mapping import FoliumMap
+    from review_store import get_review_store
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = load_checkpoint(args.checkpoint)
+    store = get_review_store()
+    landmarks = landmarks_from_csv(args.csv) if args.csv else landmarks_from_reviews(store, args.top)
+    done = set(checkpoint["done"])
+    pending = [entry for entry in landmarks if entry["landmark"] not in done]
+    print(f"{len(landmarks)} landmarks, {len(landmarks) - len(pending)} already warmed, {len(pending)} to go.")
+    summarizer = AI_Summary()
+    folium_map = FoliumMap()
+    geocode_lock = threading.Lock()
+
+    def locate(lat, lon):
+        # Nominatim allows one request at a time
+        with geocode_lock:
+            return folium_map.find_city_country(lat, lon)
+
+    limiter = RateLimiter(args.rate)
+    start = time.monotonic()
+    completed = 0
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="warm-summaries") as executor:
+        futures = {
+            executor.submit(warm_landmark, entry, summarizer, store, locate, limiter, not args.skip_reviews):
+                entry["landmark"] for entry in pending
+        }
+        for future in as_completed(futures):
+            landmark = futures[future]
+            completed += 1
+            try:
+                future.result()
+                checkpoint["done"].append(landmark)
+                checkpoint["failed"].pop(landmark, None)
+                outcome = "ok"
+            except Exception as e:
+                checkpoint["failed"][landmark] = str(e)
+                outcome = f"failed: {e}"
+            save_checkpoint(args.checkpoint, checkpoint)
+            print(f"[{completed}/{len(pending)}] {landmark}: {outcome} "
+                  f"({completed / (time.monotonic() - start):.2f} landmarks/s)")
+    metrics = summarizer.summary_cache_metrics()
+    print(f"Done: {len(checkpoint['done'])} warmed, {len(checkpoint['failed'])} failed, "
+          f"{metrics['entries']} summaries cached.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate landmark and review summaries into the summary cache.")
+    parser.add_argument("--csv", help="CSV of landmarks to warm instead of the most reviewed ones.")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_LANDMARKS, help="Number of most reviewed landmarks.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SECOND, help="Summary requests started per second.")
+    parser.add_argument("--skip-reviews", action="store_true", help="Only warm the landmark summaries.")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="File used to resume an interrupted run.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning.")
+    args = parser.parse_args()
+    warm(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 2
+# Each review is two writes (the review and its landmark stats), Firestore batches hold 500
+DEFAULT_MAX_BATCH_REVIEWS = 200
+# Rows claimed by a worker that died are handed to another one after this long
+CLAIM_TIMEOUT_SECONDS = 120
+MAX_BACKOFF_SECONDS = 60
+# Reviews that failed this many flushes are moved to the dead-letter table
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+# Durable local queue of review submissions in SQLite (WAL). The caller gets an
+# acknowledgement as soon as the row is committed; a background thread flushes the
+# queue through `flush(reviews)` in batches. Several processes can share one queue
+# file, rows are claimed before they are flushed so each one is written once.
+# Every review gets an id when it is queued, `flush` must use it so that a batch
+# retried after a partial failure or a crash does not write a review twice.
+class ReviewWriteQueue:
+
+    def __init__(self,
+                 path,
+                 flush,
+                 max_batch=DEFAULT_MAX_BATCH_REVIEWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.flush = flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.flushed = 0
+        self.failures = 0
+        self.last_error = None
+        self._worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_reviews (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_reviews (
+                    id INTEGER PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error TEXT,
+                    failed_at REAL NOT NULL
+                )
+                """)
+        self._thread = threading.Thread(target=self._run, name="review-write-behind", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def put(self, review):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO pending_reviews (payload, enqueued_at) VALUES (?, ?)",
+                (json.dumps(dict(review, id=uuid.uuid4().hex)), time.time()),
+            )
+            row_id = cursor.lastrowid
+        finally:
+            conn.close()
+        if self.pending_count() >= self.max_batch:
+            self._wake.set()
+        return row_id
+
+    def pending_count(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM pending_reviews").fetchone()[0]
+        finally:
+            conn.close()
+
+    def dead_count(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM dead_reviews").fetchone()[0]
+        finally:
+            conn.close()
+
+    def is_pending(self, row_id):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM pending_reviews WHERE id = ?", (row_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def _claim(self, conn):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                UPDATE pending_reviews SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM pending_reviews
+                    WHERE claimed_by IS NULL OR claimed_at < ?
+                    ORDER BY id LIMIT ?
+                )
+                """,
+                (self._worker_id, now, now - CLAIM_TIMEOUT_SECONDS, self.max_batch),
+            )
+            rows = conn.execute(
+                "SELECT id, payload, enqueued_at, attempts FROM pending_reviews WHERE claimed_by = ? ORDER BY id",
+                (self._worker_id,),
+            ).fetchall()
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def flush_pending(self):
+        conn = self._connect()
+        try:
+            rows = self._claim(conn)
+            if not rows:
+                return 0
+            try:
+                self._flush_rows(conn, rows)
+            except Exception as e:
+                conn.executemany("UPDATE pending_reviews SET claimed_by = NULL WHERE id = ?",
+                                 [(row[0],) for row in rows])
+                if not any(attempts >= self.max_attempts for _, _, _, attempts in rows):
+                    raise
+                # Flushed one by one, so only the reviews that fail on their own are given up on
+                for row in rows:
+                    try:
+                        self._flush_rows(conn, [row])
+                    except Exception as e:
+                        if row[3] >= self.max_attempts:
+                            self._dead_letter(conn, row, e)
+            return len(rows)
+        finally:
+            conn.close()
+
+    def _flush_rows(self, conn, rows):
+        self.flush([dict(json.loads(payload), enqueued_at=enqueued_at) for _, payload, enqueued_at, _ in rows])
+        conn.executemany("DELETE FROM pending_reviews WHERE id = ?", [(row[0],) for row in rows])
+        self.flushed += len(rows)
+
+    def _dead_letter(self, conn, row, error):
+        row_id, payload, enqueued_at, attempts = row
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO dead_reviews (id, payload, enqueued_at, attempts, error, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (row_id, payload, enqueued_at, attempts, str(error), time.time()),
+            )
+            conn.execute("DELETE FROM pending_reviews WHERE id = ?", (row_id,))
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            raise
+        self.last_error = str(error)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while not self._stopped.is_set():
+            self._wake.wait(backoff)
+            self._wake.clear()
+            try:
+                while self.flush_pending() == self.max_batch:
+                    pass
+                backoff = self.flush_interval
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    def stop(self, flush=True):
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        if flush:
+            while self.flush_pending():
+                pass
+
+    def metrics(self):
+        return {
+            "pending": self.pending_count(),
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "dead": self.dead_count(),
+            "last_error": self.last_error,
+        }